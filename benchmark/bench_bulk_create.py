@@ -0,0 +1,34 @@
+# Compares ParameterSet.find_or_create_many / create_runs_many with the loop over the points.
+#   python -m benchmark.bench_bulk_create [num_points] [num_runs]
+import sys, time, random
+from caravan.tables import Tables
+from caravan.parameter_set import ParameterSet
+
+
+def per_point(points, num_runs):
+    for p in points:
+        ps = ParameterSet.find_or_create(*p)
+        ps.create_runs(num_runs)
+
+
+def bulk(points, num_runs):
+    pss = ParameterSet.find_or_create_many(points)
+    ParameterSet.create_runs_many(pss, num_runs)
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    rnd = random.Random(1234)
+    points = [(rnd.random(), rnd.random(), rnd.randint(0, 100)) for _ in range(num_points)]
+    for f in (per_point, bulk):
+        Tables.get().clear()
+        t = time.perf_counter()
+        f(points, num_runs)
+        elapsed = time.perf_counter() - t
+        print("%-9s %d points, %d runs: %.2f sec, %.0f points/sec" % (
+            f.__name__, num_points, len(Tables.get().tasks_table), elapsed, num_points / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Measures the throughput of server_stub.EventQueue.
+#   python -m benchmark.bench_event_queue [num_tasks] [num_places]
+import sys, time, random
+from caravan.server_stub import EventQueue
+
+
+class _Task:
+    def __init__(self, dt):
+        self.dt = dt
+        self.start_at = None
+        self.finish_at = None
+        self.place_id = None
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    num_places = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rnd = random.Random(1234)
+    tasks = [_Task(rnd.randint(1, 1000)) for _ in range(num_tasks)]
+    q = EventQueue(num_places)
+    t = time.perf_counter()
+    q.push_all(tasks)
+    n = 0
+    while q.pop() is not None:
+        n += 1
+    elapsed = time.perf_counter() - t
+    print("%d tasks on %d places: %.2f sec, %.0f events/sec" % (n, num_places, elapsed, n / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Compares the thread-backed pseudo_fiber with the generator-based fiber.
+#   python -m benchmark.bench_fiber [num_switches] [num_fibers]
+import sys, time, gc
+from caravan import pseudo_fiber, generator_fiber
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_pseudo(num_switches, num_fibers):
+    main = pseudo_fiber.current()
+
+    def f():
+        while True:
+            main.switch()
+
+    fb = pseudo_fiber.Fiber(target=f)
+    t = time.perf_counter()
+    for _ in range(num_switches):
+        fb.switch()
+    latency = (time.perf_counter() - t) / num_switches
+
+    gc.collect()
+    m = rss_kb()
+    fibers = [pseudo_fiber.Fiber(target=f) for _ in range(num_fibers)]
+    for x in fibers:
+        x.switch()
+    mem = (rss_kb() - m) / num_fibers
+    return latency, mem
+
+
+def bench_generator(num_switches, num_fibers):
+    main = generator_fiber.current()
+
+    def f():
+        while True:
+            yield main
+
+    fb = generator_fiber.Fiber(target=f)
+    t = time.perf_counter()
+    for _ in range(num_switches):
+        fb.switch()
+    latency = (time.perf_counter() - t) / num_switches
+
+    gc.collect()
+    m = rss_kb()
+    fibers = [generator_fiber.Fiber(target=f) for _ in range(num_fibers)]
+    for x in fibers:
+        x.switch()
+    mem = (rss_kb() - m) / num_fibers
+    return latency, mem
+
+
+def main():
+    num_switches = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_fibers = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print("%-16s %20s %20s" % ("backend", "switch [us]", "memory/fiber [KB]"))
+    for name, f in [("generator_fiber", bench_generator), ("pseudo_fiber", bench_pseudo)]:
+        latency, mem = f(num_switches, num_fibers)
+        print("%-16s %20.2f %20.2f" % (name, latency * 1.0e6, mem))
+
+
+if __name__ == "__main__":
+    main()
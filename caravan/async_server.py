@@ -0,0 +1,152 @@
+import sys, os, time, asyncio
+from .server import Server
+from .protocol import HANDSHAKE, RESULT_HEADER
+from .transport import open_stdout
+from .metrics import SIZE_BUCKETS
+
+
+class AsyncServer(Server):
+    # Drives searches written as `async def` coroutines on an asyncio event loop.
+    #
+    #   server = AsyncServer.start()
+    #   async def main():
+    #       ps = ParameterSet.find_or_create(0, 1)
+    #       ps.create_runs_upto(3)
+    #       await server.wait_ps(ps)
+    #   server.run(main())
+
+    def __init__(self, logger=None, max_in_flight=None, result_cache=None, binary_protocol=None, metrics=None):
+        super().__init__(logger, max_in_flight=max_in_flight, result_cache=result_cache,
+                         binary_protocol=binary_protocol, metrics=metrics)
+        self._main_task = None
+        self._pending_replies = 0  # number of results the scheduler waits a reply for
+        self._num_waking = 0  # number of coroutines whose wait is done but which are not resumed yet
+        self._submit_requested = False
+
+    @classmethod
+    def start(cls, logger=None, redirect_stdout=False, max_in_flight=None, resume_from=None, result_cache=None,
+              binary_protocol=None, metrics=None):
+        cls._load_tables(resume_from)
+        Server._instance = cls(logger, max_in_flight, result_cache, binary_protocol, metrics)
+        Server._instance._out = open_stdout(Server._instance._protocol.binary)
+        if redirect_stdout:
+            sys.stdout = sys.stderr
+        return Server._instance
+
+    def __enter__(self):
+        raise TypeError("use AsyncServer.run() instead of the with statement")
+
+    def run(self, main, reader=None):
+        return asyncio.run(self.serve(main, reader))
+
+    async def serve(self, main, reader=None):
+        loop = asyncio.get_running_loop()
+        if reader is None:
+            reader = await self._open_stdin(loop)
+        if self._protocol.binary:
+            self._out.write(HANDSHAKE)
+            self._out.flush()
+            self._accept_handshake(await reader.readline())
+        self._pending_replies = 1  # the first tasks are sent without receiving a result
+        self._main_task = asyncio.ensure_future(main)
+        self._main_task.add_done_callback(lambda _: self._submit_all())
+        await self._settle()
+        self._submit_all()
+        self._logger.debug("start polling")
+        while True:
+            t0 = time.perf_counter()
+            msg = await self._read_message_async(reader)
+            self._input_waited(t0)
+            if not msg:
+                break
+            t = self._store_result_message(msg)
+            if t is None:
+                break
+            if self.metrics is not None:
+                self.metrics.observe("receive_batch_size", 1, SIZE_BUCKETS)  # results are processed one by one
+            self._pending_replies += 1
+            self._result_received(t)
+            await self._settle()
+            self._submit_all()
+            if self.metrics is not None:
+                self.metrics.maybe_flush()
+        if self.result_cache is not None:
+            self.result_cache.commit()
+        if self.metrics is not None:
+            self.metrics.flush()
+        if not self._main_task.done():
+            self._main_task.cancel()
+            raise RuntimeError("the scheduler finished before the search")
+        return self._main_task.result()
+
+    async def _open_stdin(self, loop):
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        await loop.connect_read_pipe(lambda: protocol, os.fdopen(sys.stdin.fileno(), 'rb', 0))
+        return reader
+
+    async def _read_message_async(self, reader):
+        if not self._protocol.binary:
+            return await reader.readline()
+        try:
+            header = await reader.readexactly(RESULT_HEADER.size)
+            return header + await reader.readexactly(8 * RESULT_HEADER.unpack(header)[5])
+        except asyncio.IncompleteReadError:
+            return b""
+
+    async def _settle(self):
+        # run the coroutines woken up by the callbacks until they wait again
+        self._exec_callback()
+        while self._num_waking > 0:
+            await asyncio.sleep(0)
+            self._exec_callback()
+        await asyncio.sleep(0)
+        self._exec_callback()
+
+    async def _wait(self, watch, target):
+        fut = asyncio.get_running_loop().create_future()
+
+        def _callback(x):
+            if not fut.done():
+                self._num_waking += 1
+                fut.set_result(x)
+
+        watch(target, _callback)
+        self._request_submit()
+        try:
+            return await fut
+        finally:
+            if fut.done() and not fut.cancelled():
+                self._num_waking -= 1
+
+    async def wait_ps(self, ps):
+        return await self._wait(Server.watch_ps, ps)
+
+    async def wait_all_ps(self, ps_set):
+        return await self._wait(Server.watch_all_ps, ps_set)
+
+    async def wait_task(self, task):
+        return await self._wait(Server.watch_task, task)
+
+    async def wait_all_tasks(self, tasks):
+        return await self._wait(Server.watch_all_tasks, tasks)
+
+    def _request_submit(self):
+        if not self._submit_requested:
+            self._submit_requested = True
+            asyncio.get_running_loop().call_soon(self._submit_all)
+
+    def _submit_all(self):
+        self._submit_requested = False
+        self._enqueue_new_tasks()  # results found in the cache wake up coroutines, which request a submission
+        self._exec_callback()
+        if self._pending_replies == 0:
+            return  # new tasks are sent with the reply to the next result
+        if not (self._has_tasks_to_submit() or self._num_in_flight > 0 or self._main_task.done()):
+            return  # keep the scheduler waiting until the search creates tasks or finishes
+        super()._submit_all()
+        self._pending_replies -= 1
+        while self._pending_replies > 0:
+            self._print_tasks([])
+            self._pending_replies -= 1
+        self._flush_tasks()
@@ -0,0 +1,102 @@
+import inspect
+
+# Fibers built on Python generators. No thread is created for a fiber.
+# A generator fiber suspends itself by yielding the fiber to switch to;
+# it cannot be suspended from a nested function call which is not a generator.
+# Plain functions given as targets run on the stack of the fiber which switches to them.
+
+_current_fiber = None
+
+
+class error(Exception):
+    pass
+
+
+def set_current_fiber(f):
+    global _current_fiber
+    _current_fiber = f
+
+
+def current():
+    global _current_fiber
+    if _current_fiber is None:
+        _current_fiber = _create_main_fiber()
+    return _current_fiber
+
+
+class Fiber:
+    requires_yield = True  # a fiber must yield to switch to another fiber
+
+    def __init__(self, target=None, args=[], kwargs={}):
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs
+        self._gen = None
+        self._started = False
+        self._ended = False
+        self._running = False
+        self.parent = current()  # only the root fiber's parent is None
+
+    @classmethod
+    def current(cls):
+        return current()
+
+    def switch(self):
+        if self._ended:
+            raise error('Fiber has ended')
+        curr = current()
+        if curr._gen is not None and curr._running:
+            raise error('a generator fiber must yield the fiber to switch to')
+        if self._running:
+            raise error('Fiber is running on the stack')
+
+        fb = self
+        try:
+            while True:
+                set_current_fiber(fb)
+                nxt = fb._step()
+                if nxt is None or nxt is curr or not nxt._can_resume():
+                    break
+                fb = nxt
+        finally:
+            set_current_fiber(curr)
+
+    def _can_resume(self):
+        return not self._ended and not self._running and (self._gen is not None or not self._started)
+
+    def _step(self):
+        self._running = True
+        try:
+            if not self._started:
+                self._started = True
+                r = self._target(*self._args, **self._kwargs)
+                if not inspect.isgenerator(r):
+                    self._ended = True
+                    return None
+                self._gen = r
+            return next(self._gen)
+        except StopIteration:
+            self._ended = True
+            return None
+        except:
+            self._ended = True
+            raise
+        finally:
+            self._running = False
+
+    def is_alive(self):
+        return not self._ended
+
+    def __getstate__(self):
+        raise TypeError('cannot serialize Fiber object')
+
+
+def _create_main_fiber():
+    main_fiber = Fiber.__new__(Fiber)
+    main_fiber._target = None
+    main_fiber._gen = None
+    main_fiber._started = True
+    main_fiber._ended = False
+    main_fiber._running = True
+    main_fiber.parent = None
+    return main_fiber
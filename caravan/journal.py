@@ -0,0 +1,59 @@
+import os
+import pickle
+import struct
+
+_HEADER = struct.Struct('>Q')
+
+
+class Journal:
+    # Append-only log of the changes of Tables.
+    # Records are written in frames of (length, pickled list of records).
+    # An incomplete frame at the end of the file, left by a crash, is ignored when reading.
+
+    def __init__(self, path, flush_every=1000):
+        self.path = path
+        self.flush_every = flush_every
+        self.num_records = 0  # number of records written since the journal was truncated
+        self._buf = []
+        self._f = open(path, 'ab')
+
+    def __len__(self):
+        return self.num_records + len(self._buf)
+
+    def append(self, record):
+        self._buf.append(record)
+        if len(self._buf) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            data = pickle.dumps(self._buf, protocol=pickle.HIGHEST_PROTOCOL)
+            self._f.write(_HEADER.pack(len(data)) + data)
+            self.num_records += len(self._buf)
+            self._buf = []
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def truncate(self):
+        self._buf = []
+        self._f.truncate(0)
+        self._f.seek(0)
+        self.num_records = 0
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+    @staticmethod
+    def read(path):
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                n, = _HEADER.unpack(header)
+                data = f.read(n)
+                if len(data) < n:
+                    return
+                for record in pickle.loads(data):
+                    yield record
@@ -0,0 +1,104 @@
+import os
+import time
+import queue
+import threading
+import subprocess
+from .server import Server
+
+
+class _LocalServer(Server):
+    # Runs the commands of the tasks on this machine instead of sending them to the scheduler.
+    # Each task runs in `<work_dir>/<task id>` by one of `num_proc` workers, whose index is reported as place_id.
+    # The results are read from `_results.txt` in that directory as the scheduler does.
+    # start_at and finish_at are in milliseconds since the server started.
+
+    def __init__(self, num_proc, logger, work_dir, shell=True, max_in_flight=None, result_cache=None, metrics=None):
+        super().__init__(logger, max_in_flight=max_in_flight, result_cache=result_cache, binary_protocol=False,
+                         metrics=metrics)
+        self.num_proc = num_proc
+        self.work_dir = work_dir
+        self.shell = shell
+        self._jobs = queue.Queue()
+        self._done = queue.Queue()
+        self._num_running = 0  # number of tasks given to the workers whose results are not received yet
+        self._t0 = time.monotonic()
+        self._workers = []
+
+    def __enter__(self):
+        for i in range(self.num_proc):
+            th = threading.Thread(target=self._work, args=(i,), daemon=True)
+            th.start()
+            self._workers.append(th)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return super().__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            for _ in self._workers:
+                self._jobs.put(None)
+            for th in self._workers:
+                th.join()
+            self._workers = []
+
+    def _print_tasks(self, tasks):
+        for t in tasks:
+            self._jobs.put((t, t.command))
+        self._num_running += len(tasks)
+
+    def _receive_result(self):
+        if self._num_running == 0:
+            return None
+        t0 = time.perf_counter()
+        t, result = self._done.get()
+        self._input_waited(t0)
+        self._num_running -= 1
+        t.store_result(*result)
+        return t
+
+    def _work(self, place_id):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            t, cmd = job
+            try:
+                result = self._execute(t.id, cmd, place_id)
+            except Exception as e:
+                # a result is always given back, otherwise _receive_result waits for it forever
+                self._logger.error("failed to run Task %d: %r" % (t.id, e))
+                now = self._now()
+                result = [], -1, place_id, now, now
+            self._done.put((t, result))
+
+    def _execute(self, task_id, cmd, place_id):
+        d = os.path.join(self.work_dir, str(task_id))
+        os.makedirs(d, exist_ok=True)
+        start_at = self._now()
+        try:
+            rc = subprocess.call(cmd, shell=self.shell, cwd=d)
+        except OSError as e:
+            self._logger.error("failed to run Task %d: %s" % (task_id, e))
+            rc = -1
+        finish_at = self._now()
+        return self._read_results(d), rc, place_id, start_at, finish_at
+
+    @staticmethod
+    def _read_results(d):
+        path = os.path.join(d, "_results.txt")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [float(x) for x in f.read().split()]
+
+    def _now(self):
+        return int(1000 * (time.monotonic() - self._t0))
+
+
+def start_local(num_proc=None, logger=None, work_dir='.', shell=True, max_in_flight=None, resume_from=None,
+                result_cache=None, metrics=None):
+    # runs the tasks by at most num_proc (the number of CPUs by default) processes on this machine
+    Server._load_tables(resume_from)
+    num_proc = num_proc or os.cpu_count() or 1
+    Server._instance = _LocalServer(num_proc, logger, work_dir, shell, max_in_flight, result_cache, metrics)
+    return Server._instance
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import bisect
+
+# upper bounds of the histogram buckets
+DURATION_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384)
+
+
+class Metrics:
+    # Counters, gauges and histograms of the server, written to the sinks every `interval` seconds.
+    # The server records nothing when its `metrics` is None.
+    #
+    #   metrics = Metrics([JsonLinesSink("metrics.jsonl"), PrometheusSink("caravan.prom")])
+    #   server = Server.start(metrics=metrics)
+
+    def __init__(self, sinks=(), interval=10.0):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.counters = {}  # (name, labels) => number
+        self.gauges = {}  # (name, labels) => number
+        self.histograms = {}  # (name, labels) => _Histogram
+        self._last_flush = time.monotonic()
+        self._last_counters = {}
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = _Histogram(buckets)
+        h.observe(value)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        now = time.monotonic()
+        snapshot = self.snapshot(now - self._last_flush)
+        self._last_flush = now
+        self._last_counters = dict(self.counters)
+        for sink in self.sinks:
+            sink.write(self, snapshot)
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+    def snapshot(self, elapsed=None):
+        # a JSON-serializable dict of the metrics. Rates per second of the counters since the last flush are
+        # included when elapsed is given.
+        s = {"time": time.time(),
+             "counters": {_key_str(k): v for k, v in self.counters.items()},
+             "gauges": {_key_str(k): v for k, v in self.gauges.items()},
+             "histograms": {_key_str(k): h.to_dict() for k, h in self.histograms.items()}}
+        if elapsed:
+            s["rates"] = {_key_str(k): (v - self._last_counters.get(k, 0)) / elapsed for k, v in self.counters.items()}
+        return s
+
+    def prometheus_text(self, prefix="caravan_"):
+        lines = []
+        for name, typ, items in self._families():
+            lines.append("# TYPE %s%s %s" % (prefix, name, typ))
+            for labels, v in items:
+                if typ != "histogram":
+                    suffix = "_total" if typ == "counter" else ""
+                    lines.append("%s%s%s%s %s" % (prefix, name, suffix, _labels_str(labels), _num(v)))
+                    continue
+                for le, c in v.cumulative():
+                    lines.append("%s%s_bucket%s %d" % (prefix, name, _labels_str(labels + (("le", le),)), c))
+                lines.append("%s%s_sum%s %s" % (prefix, name, _labels_str(labels), _num(v.sum)))
+                lines.append("%s%s_count%s %d" % (prefix, name, _labels_str(labels), v.count))
+        return "\n".join(lines) + "\n"
+
+    def _families(self):
+        families = {}
+        for typ, table in (("counter", self.counters), ("gauge", self.gauges), ("histogram", self.histograms)):
+            for (name, labels), v in sorted(table.items(), key=lambda kv: kv[0]):
+                families.setdefault((name, typ), []).append((labels, v))
+        return [(name, typ, items) for (name, typ), items in sorted(families.items())]
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is for the values above all the buckets
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        c = 0
+        out = []
+        for b, n in zip(self.buckets + ("+Inf",), self.counts):
+            c += n
+            out.append((b if b == "+Inf" else _num(b), c))
+        return out
+
+    def to_dict(self):
+        return {"buckets": dict(self.cumulative()), "sum": self.sum, "count": self.count}
+
+
+class JsonLinesSink:
+    # appends a snapshot as a line of JSON for each flush
+    def __init__(self, path):
+        self._f = open(path, 'a')
+
+    def write(self, metrics, snapshot):
+        self._f.write(json.dumps(snapshot) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class PrometheusSink:
+    # rewrites the file in the Prometheus text format for each flush, e.g. for the textfile collector of
+    # node_exporter
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, metrics, snapshot):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(metrics.prometheus_text())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        pass
+
+
+def _key_str(key):
+    name, labels = key
+    return name + _labels_str(labels)
+
+
+def _labels_str(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, v) for k, v in labels)
+
+
+def _num(v):
+    return repr(v) if isinstance(v, float) else str(v)
@@ -4,12 +4,19 @@ from . import tables
 
 
 class ParameterSet:
+    __slots__ = ('id', 'params', 'run_ids', '_num_unfinished_runs', '_results', '_mean', '_m2', '_counts',
+                 '__weakref__')
     command_func = None
 
     def __init__(self, ps_id, params):
         self.id = ps_id
         self.params = params
         self.run_ids = []
+        self._num_unfinished_runs = 0
+        self._results = []  # results of the runs finished with rc == 0, in the order of finish
+        self._mean = []  # running mean and sum of squared deviations (Welford) of each column of self._results
+        self._m2 = []
+        self._counts = []  # number of values of each column. runs may return different numbers of results
 
     @classmethod
     def set_command_func(cls, f):
@@ -30,20 +37,101 @@ class ParameterSet:
         else:
             next_id = len(t.ps_table)
             ps = cls(next_id, prm)
-            t.ps_table.append(ps)
-            t.param_ps_dict[prm] = ps
+            t.add_ps(ps)
             return ps
 
-    def create_runs(self, num_runs):
-        created = [run.Run.create(self) for _ in range(num_runs)]
+    @classmethod
+    def find_or_create_many(cls, params_array):
+        # returns the ParameterSets for the rows of a 2-D array (e.g. a NumPy grid or a sample matrix),
+        # creating the ones which do not exist yet. Duplicated rows get the same ParameterSet.
+        if hasattr(params_array, 'tolist'):
+            params_array = params_array.tolist()  # NumPy scalars to Python numbers, as given to find_or_create
+        t = tables.Tables.get()
+        found = t.param_ps_dict
+        created = {}
+        next_id = len(t.ps_table)
+        pss = []
+        for row in params_array:
+            prm = tuple(row)
+            ps = found.get(prm) or created.get(prm)
+            if ps is None:
+                ps = created[prm] = cls(next_id, prm)
+                next_id += 1
+            pss.append(ps)
+        t.add_ps_many(list(created.values()))
+        return pss
+
+    @classmethod
+    def create_runs_many(cls, pss, num_runs, priority=0):
+        # creates num_runs runs for each ParameterSet. Returns the created runs.
+        t = tables.Tables.get()
+        if t.is_replaying():
+            return [r for ps in pss for r in ps.create_runs(num_runs, priority)]
+        next_id = len(t.tasks_table)
+        created = []
+        Run = run.Run
+        for ps in pss:
+            seed = len(ps.run_ids)
+            runs = [Run(next_id + i, ps.id, seed + i) for i in range(num_runs)]
+            if priority != 0:
+                for r in runs:
+                    r.priority = priority
+            ps.run_ids.extend(range(next_id, next_id + num_runs))
+            ps._num_unfinished_runs += num_runs
+            next_id += num_runs
+            created.extend(runs)
+        t.add_tasks(created)
         return created
 
-    def create_runs_upto(self, target_num):
-        current = len(self.run_ids)
+    def create_runs(self, num_runs, priority=0):
+        created = [run.Run.create(self, priority) for _ in range(num_runs)]
+        return created
+
+    def create_runs_upto(self, target_num, priority=0):
+        current = tables.Tables.get().num_created_runs(self)
         if target_num > current:
-            self.create_runs(target_num - current)
+            self.create_runs(target_num - current, priority)
         return self.runs()[:target_num]
 
+    def set_priority(self, priority):
+        for r in self.runs():
+            if not r.is_finished():
+                r.set_priority(priority)
+
+    def _add_run(self, r):
+        self.run_ids.append(r.id)
+        self._num_unfinished_runs += 1
+
+    def _run_finished(self, r):
+        self._num_unfinished_runs -= 1
+        if r.rc == 0:
+            self._add_results(r.results)
+
+    def _add_results(self, results):
+        self._results.append(results)
+        mean, m2, counts = self._mean, self._m2, self._counts
+        for i, x in enumerate(results):
+            if i == len(mean):
+                mean.append(x)
+                m2.append(0.0)
+                counts.append(1)
+                continue
+            counts[i] += 1
+            d = x - mean[i]
+            mean[i] += d / counts[i]
+            m2[i] += d * (x - mean[i])
+
+    def _rebuild_aggregates(self, tasks_table):
+        runs = [tasks_table[rid] for rid in self.run_ids]
+        self._num_unfinished_runs = len([r for r in runs if not r.is_finished()])
+        self._results = []
+        self._mean = []
+        self._m2 = []
+        self._counts = []
+        for r in runs:
+            if r.is_finished() and r.rc == 0:
+                self._add_results(r.results)
+
     def runs(self):
         return [tables.Tables.get().tasks_table[rid] for rid in self.run_ids]
 
@@ -51,20 +139,76 @@ class ParameterSet:
         return [r for r in self.runs() if r.is_finished()]
 
     def is_finished(self):
-        return all([r.is_finished() for r in self.runs()])
+        return self._num_unfinished_runs == 0
 
     def average_results(self):
-        runs = [r for r in self.finished_runs() if r.rc == 0]
-        if len(runs) == 0:
+        if len(self._results) == 0:
             return ()
-        else:
-            n = len(runs[0].results)
-            averages = []
-            for i in range(n):
-                results = [r.results[i] for r in runs]
-                avg = sum(results) / len(results)
-                averages.append(avg)
-            return tuple(averages)
+        return tuple(self._mean)
+
+    def variance_results(self):
+        # unbiased variances of the results. Empty when less than two runs finished with rc == 0.
+        # NaN for the columns which less than two runs returned.
+        if len(self._results) < 2:
+            return ()
+        return tuple(m2 / (n - 1) if n > 1 else float('nan') for m2, n in zip(self._m2, self._counts))
+
+    def result_stats(self):
+        # statistics of the results of the runs finished with rc == 0. Requires NumPy.
+        # returns a dict of "count", and arrays of "mean", "var", "stderr", "min", "max" for each result column.
+        stats = {k: v[0] for k, v in self.__class__.result_stats_many([self]).items()}
+        stats["count"] = int(stats["count"])
+        return stats
+
+    @classmethod
+    def result_stats_many(cls, ps_list):
+        # statistics of multiple ParameterSets at once. Each value is an array whose first axis is the ParameterSet.
+        # The values are NaN for the ParameterSets without results, and "var" and "stderr" need two results.
+        # When runs return different numbers of results, each column is computed from the runs which have it.
+        import numpy as np
+        counts = np.array([len(ps._results) for ps in ps_list], dtype=np.int64)
+        rows = [r for ps in ps_list for r in ps._results]
+        num_cols = max(len(r) for r in rows) if rows else 0
+        k = len(ps_list)
+        shape = (k, num_cols)
+        mean, var, minimum, maximum = [np.full(shape, np.nan) for _ in range(4)]
+        n = np.zeros(shape, dtype=np.int64)  # number of values of each column
+        if rows:
+            lengths = np.array([len(r) for r in rows])
+            valid = np.arange(num_cols) < lengths[:, None]
+            if valid.all():
+                data = np.asarray(rows, dtype=np.float64).reshape(len(rows), num_cols)
+            else:
+                data = np.zeros((len(rows), num_cols))
+                data[valid] = [x for r in rows for x in r]
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            nonempty = counts > 0
+            starts = offsets[nonempty]
+            n[nonempty] = np.add.reduceat(valid, starts, axis=0)
+            seg = np.repeat(np.arange(k), counts)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean[nonempty] = np.add.reduceat(data, starts, axis=0) / n[nonempty]
+                sq = np.where(valid, (data - mean[seg]) ** 2, 0.0)
+                var[nonempty] = np.where(n[nonempty] > 1, np.add.reduceat(sq, starts, axis=0) / (n[nonempty] - 1),
+                                         np.nan)
+            minimum[nonempty] = np.fmin.reduceat(np.where(valid, data, np.nan), starts, axis=0)
+            maximum[nonempty] = np.fmax.reduceat(np.where(valid, data, np.nan), starts, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stderr = np.sqrt(var / n)
+        return {"count": counts, "mean": mean, "var": var, "stderr": stderr, "min": minimum, "max": maximum}
+
+    def __setstate__(self, state):
+        # accepts the states pickled before __slots__ were introduced
+        if isinstance(state, tuple):
+            d, slots = state
+            state = dict(d or {}, **(slots or {}))
+        self._num_unfinished_runs = None  # rebuilt by Tables after loading
+        self._results = None
+        self._mean = None
+        self._m2 = None
+        self._counts = None
+        for k, v in state.items():
+            setattr(self, k, v)
 
     def to_dict(self):
         o = OrderedDict()
@@ -81,6 +225,25 @@ class ParameterSet:
     def find(cls, id):
         return tables.Tables.get().ps_table[id]
 
+    @classmethod
+    def nearest(cls, point, k=1):
+        # the k ParameterSets nearest to point in the Euclidean distance of params, nearest first.
+        # Only the ParameterSets whose params are numbers are searched.
+        t = tables.Tables.get()
+        return [t.ps_table[i] for (_, i) in t.spatial_index().nearest(point, k)]
+
+    @classmethod
+    def in_range(cls, lo, hi):
+        # the ParameterSets whose params are in the box lo <= params <= hi, in the order of id
+        t = tables.Tables.get()
+        return [t.ps_table[i] for i in t.spatial_index().in_range(lo, hi)]
+
+    @classmethod
+    def set_spatial_index(cls, cell_size):
+        # sets the size of the grid cells (a number or a sequence per dimension) used by nearest and in_range.
+        # By default it is chosen from the distribution of params.
+        tables.Tables.get().spatial_index(cell_size)
+
     def dumps(self):
         runs_str = ",\n".join(["    " + r.dumps() for r in self.runs()])
         return "{\"id\": %d, \"params\": %s, \"runs\": [\n%s\n]}" % (self.id, str(self.params), runs_str)
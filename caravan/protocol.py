@@ -0,0 +1,107 @@
+import struct
+
+# Messages between the search engine and the scheduler.
+#
+# text protocol (default)
+#   engine => scheduler: "<task id> <command>\n" for each task, followed by an empty line
+#   scheduler => engine: "<task id> <rc> <place id> <start at> <finish at> <result>...\n"
+#
+# binary protocol
+#   At startup the engine sends HANDSHAKE and the scheduler accepts it by sending back the same line.
+#   When the scheduler replies with any other line, such as an empty line, both sides use the text protocol.
+#   engine => scheduler: number of tasks (>q), followed by (task id, length of command) (>2q) and
+#                        the UTF-8 encoded command for each task
+#   scheduler => engine: task id, rc, place id, start at, finish at, number of results (>6q),
+#                        followed by the results (>{n}d). This is the layout of a record of Task.dump_binary.
+
+HANDSHAKE = b"caravan-binary-protocol 1\n"
+RESULT_HEADER = struct.Struct('>6q')
+_COUNT = struct.Struct('>q')
+_TASK_HEADER = struct.Struct('>2q')
+
+
+def get_protocol(binary):
+    return BinaryProtocol() if binary else TextProtocol()
+
+
+class TextProtocol:
+    binary = False
+    empty = ""
+
+    def encode_tasks(self, tasks):
+        lines = ["%d %s\n" % (t.id, t.command) for t in tasks]
+        lines.append("\n")
+        return "".join(lines)
+
+    def message_end(self, buf):
+        # end of the first message in buf. -1 if the message is incomplete.
+        idx = buf.find(b"\n")
+        return idx + 1 if idx >= 0 else -1
+
+    def decode_result(self, msg):
+        # returns (task_id, results, rc, place_id, start_at, finish_at), or None for an empty message
+        line = msg.decode().rstrip()
+        if not line: return None
+        l = line.split(' ')
+        tid, rc, place_id, start_at, finish_at = [int(x) for x in l[:5]]
+        results = [float(x) for x in l[5:]]
+        return tid, results, rc, place_id, start_at, finish_at
+
+    # scheduler side
+    def read_tasks(self, f):
+        # returns a list of (task_id, command) read from a binary file object, or None at EOF
+        tasks = []
+        for line in f:
+            line = line.decode().rstrip("\n")
+            if not line:
+                return tasks
+            tid, cmd = line.split(' ', 1)
+            tasks.append((int(tid), cmd))
+        return None
+
+    def encode_result(self, tid, results, rc, place_id, start_at, finish_at):
+        fields = [str(x) for x in (tid, rc, place_id, start_at, finish_at)] + [repr(float(x)) for x in results]
+        return (" ".join(fields) + "\n").encode()
+
+
+class BinaryProtocol:
+    binary = True
+    empty = b""
+
+    def encode_tasks(self, tasks):
+        chunks = [_COUNT.pack(len(tasks))]
+        for t in tasks:
+            cmd = t.command.encode()
+            chunks.append(_TASK_HEADER.pack(t.id, len(cmd)))
+            chunks.append(cmd)
+        return b"".join(chunks)
+
+    def message_end(self, buf):
+        if len(buf) < RESULT_HEADER.size:
+            return -1
+        n = RESULT_HEADER.unpack_from(buf)[5]
+        end = RESULT_HEADER.size + 8 * n
+        return end if len(buf) >= end else -1
+
+    def decode_result(self, msg):
+        # an incomplete message is left only when the scheduler exits in the middle of a message
+        if self.message_end(msg) < 0: return None
+        tid, rc, place_id, start_at, finish_at, n = RESULT_HEADER.unpack_from(msg)
+        results = struct.unpack_from('>%dd' % n, msg, RESULT_HEADER.size)
+        return tid, results, rc, place_id, start_at, finish_at
+
+    # scheduler side
+    def read_tasks(self, f):
+        header = f.read(_COUNT.size)
+        if len(header) < _COUNT.size:
+            return None
+        n, = _COUNT.unpack(header)
+        tasks = []
+        for _ in range(n):
+            tid, length = _TASK_HEADER.unpack(f.read(_TASK_HEADER.size))
+            tasks.append((tid, f.read(length).decode()))
+        return tasks
+
+    def encode_result(self, tid, results, rc, place_id, start_at, finish_at):
+        return RESULT_HEADER.pack(tid, rc, place_id, start_at, finish_at, len(results)) + \
+            struct.pack('>%dd' % len(results), *results)
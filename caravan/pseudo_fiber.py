@@ -4,6 +4,10 @@ from queue import Queue
 _current_fiber = None
 
 
+class error(Exception):
+    pass
+
+
 def set_current_fiber(f):
     global _current_fiber
     _current_fiber = f
@@ -71,6 +75,7 @@ class Fiber:
         self._q.put(0)
         set_current_fiber(self)
         x = curr._q.get()
+        set_current_fiber(curr)  # needed when resumed by an ended fiber
         if x != 0:
             raise x[1].with_traceback(x[2])
 
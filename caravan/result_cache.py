@@ -0,0 +1,91 @@
+import sqlite3
+from array import array
+
+
+class ResultCache:
+    # Persistent results of tasks shared across search campaigns.
+    # Tasks are keyed by their command by default. Only the results of successful tasks (rc == 0) are kept.
+    # When the number of entries exceeds max_entries, the least recently used entries are evicted.
+
+    def __init__(self, path, max_entries=None, key=None, commit_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.key = key or (lambda t: t.command)
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        # pseudo_fiber runs the server loop on its own thread, but only one fiber runs at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, results BLOB, rc INTEGER, place_id INTEGER, start_at INTEGER, finish_at INTEGER, "
+            "last_used INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._size, clock = self._conn.execute("SELECT COUNT(*), MAX(last_used) FROM results").fetchone()
+        self._clock = (clock or 0) + 1
+        self._num_uncommitted = 0
+
+    def __len__(self):
+        return self._size
+
+    def get(self, key):
+        row = self._conn.execute(
+            "SELECT results, rc, place_id, start_at, finish_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (self._tick(), key))
+        self._modified()
+        return (tuple(array('d', row[0])),) + tuple(row[1:])
+
+    def put(self, key, results, rc, place_id, start_at, finish_at):
+        cur = self._conn.execute(
+            "UPDATE results SET results = ?, rc = ?, place_id = ?, start_at = ?, finish_at = ?, last_used = ? "
+            "WHERE key = ?",
+            (array('d', results).tobytes(), rc, place_id, start_at, finish_at, self._tick(), key))
+        if cur.rowcount == 0:
+            self._conn.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, array('d', results).tobytes(), rc, place_id, start_at, finish_at, self._tick()))
+            self._size += 1
+            if self.max_entries is not None and self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+        self._modified()
+
+    def load_result(self, task):
+        # store the cached result to the task. Returns True if found.
+        found = self.get(self.key(task))
+        if found is None:
+            return False
+        task.store_result(*found)
+        return True
+
+    def save_result(self, task):
+        if task.rc == 0:
+            self.put(self.key(task), task.results, task.rc, task.place_id, task.start_at, task.finish_at)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self._size, "max_entries": self.max_entries}
+
+    def commit(self):
+        self._conn.commit()
+        self._num_uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _modified(self):
+        self._num_uncommitted += 1
+        if self._num_uncommitted >= self.commit_every:
+            self.commit()
+
+    def _evict(self, n):
+        self._conn.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)", (n,))
+        self._size -= n
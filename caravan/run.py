@@ -5,21 +5,36 @@ from .task import Task
 
 
 class Run(Task):
+    __slots__ = ('ps_id', 'seed')
+
     def __init__(self, run_id, ps_id, seed):
         super().__init__(run_id, None)
         self.ps_id = ps_id
         self.seed = seed
 
     @classmethod
-    def create(cls, ps):
+    def create(cls, ps, priority=0):
         t = tables.Tables.get()
+        r = t.replayed_run(ps)
+        if r is not None:
+            return r
         next_seed = len(ps.run_ids)
         next_id = len(t.tasks_table)
         r = cls(next_id, ps.id, next_seed)
-        ps.run_ids.append(r.id)
-        t.tasks_table.append(r)
+        r.priority = priority
+        ps._add_run(r)
+        t.add_task(r)
         return r
 
+    def store_result(self, results, rc, place_id, start_at, finish_at):
+        # the ParameterSet is updated before Tables.result_stored, which may write a snapshot
+        newly_finished = not self.is_finished()
+        self._set_result(results, rc, place_id, start_at, finish_at)
+        t = tables.Tables.get()
+        if newly_finished and self.ps_id < len(t.ps_table):
+            t.ps_table[self.ps_id]._run_finished(self)
+        t.result_stored(self)
+
     @property
     def command(self):
         ps = self.parameter_set()
@@ -28,6 +43,9 @@ class Run(Task):
     def parameter_set(self):
         return tables.Tables.get().ps_table[self.ps_id]
 
+    def _journal_record(self):
+        return ('run', self.id, self.ps_id, self.seed, self.priority)
+
     def to_dict(self):
         o = OrderedDict()
         o["id"] = self.id
@@ -43,7 +61,7 @@ class Run(Task):
 
     @classmethod
     def all(cls):
-        return [t for t in tables.Tables.get().tasks_table if isinstance(t, cls)]
+        return tables.Tables.get().tasks_of_type(cls)
 
     @classmethod
     def find(cls, id):
@@ -1,8 +1,10 @@
-import sys, logging, os
-from collections import defaultdict
+import sys, io, logging, os, select, time, inspect, heapq
+from collections import defaultdict, deque
 
 if os.getenv("CARAVAN_USE_PSEUDO_FIBER") == "1":  # for debugging pseudo_fiber
     from .pseudo_fiber import Fiber
+elif os.getenv("CARAVAN_USE_GENERATOR_FIBER") == "1":
+    from .generator_fiber import Fiber
 else:
     try:
         from fibers import Fiber
@@ -10,11 +12,15 @@ else:
         from .pseudo_fiber import Fiber
 from .task import Task
 from .run import Run
-from .parameter_set import ParameterSet
+from .tables import Tables
+from .protocol import get_protocol, HANDSHAKE
+from .transport import StdioTransport
+from .metrics import SIZE_BUCKETS
 
 
 class Server(object):
     _instance = None
+    fiber_class = Fiber
 
     @classmethod
     def get(cls):
@@ -22,27 +28,62 @@ class Server(object):
             raise Exception("use Server.start() method")
         return cls._instance
 
-    def __init__(self, logger=None):
-        self.observed_ps = defaultdict(list)
-        self.observed_all_ps = defaultdict(list)
+    def __init__(self, logger=None, batch_size=1, batch_latency=0.0, max_in_flight=None, result_cache=None,
+                 binary_protocol=None, metrics=None):
+        self.observed_ps = defaultdict(list)  # (ps_id) => list of callback
+        self.observed_all_ps = defaultdict(list)  # (ps_id) => list of _Group waiting for the ps
         self.observed_task = defaultdict(list)
-        self.observed_all_tasks = defaultdict(list)  # (task_id) => list of (task_ids, callback)
-        self.max_submitted_task_id = 0
+        self.observed_all_tasks = defaultdict(list)  # (task_id) => list of _Group waiting for the task
+        self._events = deque()  # list of (handler, arg) to be dispatched by _exec_callback
+        self.max_submitted_task_id = 0  # tasks before this id are submitted or in self._pending
+        self._pending = []  # heap of (-priority, task_id, task) waiting for a room in the in-flight window
+        self._queued = {}  # (task_id) => priority of the tasks in self._pending
+        self._num_in_flight = 0
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be positive")
+        self.max_in_flight = max_in_flight  # max number of tasks submitted to the scheduler at a time
+        self._window_stats = {"peak_in_flight": 0, "occupancy_sum": 0.0, "num_samples": 0}
+        self.result_cache = result_cache  # ResultCache consulted before submitting tasks
         self._logger = logger or self._default_logger()
         self._fibers = []
+        self._in_plain_target = False  # True while async_ calls a target with the generator fiber backend
+        self._transport = None  # connects to the scheduler. self._in_fd and self._out are used if None
         self._out = None
+        self._out_buf = []  # encoded tasks not written to self._out yet
+        self._in_fd = None
+        self._in_buf = bytearray()
+        self._in_closed = False
+        self.batch_size = batch_size  # max number of results processed at once
+        self.batch_latency = batch_latency  # max seconds to wait for more results in a batch
+        if binary_protocol is None:
+            binary_protocol = os.getenv("CARAVAN_BINARY_PROTOCOL") == "1"
+        self.binary_protocol = binary_protocol  # proposed to the scheduler at each connection
+        self._protocol = get_protocol(binary_protocol)  # see caravan/protocol.py
+        self.metrics = metrics  # caravan.metrics.Metrics. nothing is recorded if None
 
     @classmethod
-    def start(cls, logger=None, redirect_stdout=False):
-        cls._instance = cls(logger)
-        cls._instance._out = os.fdopen(sys.stdout.fileno(), mode='w', buffering=1)
-        sys.stdin = os.fdopen(sys.stdin.fileno(), mode='r', buffering=1)
+    def start(cls, logger=None, redirect_stdout=False, batch_size=1, batch_latency=0.0, max_in_flight=None,
+              resume_from=None, result_cache=None, binary_protocol=None, transport=None, metrics=None):
+        # the scheduler talks to the server via stdin/stdout unless a transport such as SocketTransport is given
+        cls._load_tables(resume_from)
+        cls._instance = cls(logger, batch_size, batch_latency, max_in_flight, result_cache, binary_protocol,
+                            metrics)
+        cls._instance._transport = transport or StdioTransport()
         if redirect_stdout:
             sys.stdout = sys.stderr
         return cls._instance
 
+    @staticmethod
+    def _load_tables(path):
+        # resume a search from the tables saved at path, if it exists.
+        # Finished tasks are not submitted again and the search script is replayed on the loaded tables.
+        if path is None:
+            return
+        if os.path.exists(path) or os.path.exists(path + ".journal"):
+            Tables.load(path).begin_replay()
+
     def __enter__(self):
-        self._loop_fiber = Fiber(target=self._loop)
+        self._loop_fiber = self.fiber_class(target=self._loop)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is not None:
@@ -52,94 +93,141 @@ class Server(object):
 
     @classmethod
     def watch_ps(cls, ps, callback):
-        cls.get().observed_ps[ps.id].append(callback)
+        self = cls.get()
+        self.observed_ps[ps.id].append(callback)
+        if ps.is_finished():
+            self._events.append((self._dispatch_ps, ps))
 
     @classmethod
     def watch_all_ps(cls, ps_set, callback):
-        ids = [ps.id for ps in ps_set]
-        key = tuple(ids)
-        cls.get().observed_all_ps[key].append(callback)
+        self = cls.get()
+        g = _Group(list(ps_set), callback)
+        if not self._wait_for_ps_group(g):
+            self._events.append((self._dispatch_ps_group, g))
 
     @classmethod
     def watch_task(cls, task, callback):
-        cls.get().observed_task[task.id].append(callback)
+        self = cls.get()
+        self.observed_task[task.id].append(callback)
+        if task.is_finished():
+            self._events.append((self._dispatch_task, task))
 
     @classmethod
     def watch_all_tasks(cls, tasks, callback):
-        key = tuple([t.id for t in tasks])
-        for t in tasks:
-            pair = (key, callback)
-            cls.get().observed_all_tasks[t.id].append(pair)
+        self = cls.get()
+        g = _Group(list(tasks), callback)
+        for t in g.members:
+            if not t.is_finished():
+                self.observed_all_tasks[t.id].append(g)
+                g.remaining += 1
+        if g.remaining == 0:
+            self._events.append((self._dispatch_task_group, g))
 
     @classmethod
-    def async(cls, func, *args, **kwargs):
+    def async_(cls, func, *args, **kwargs):
         self = cls.get()
 
-        def _f():
-            func(*args, **kwargs)
-            self._loop_fiber.switch()
-
-        fb = Fiber(target=_f)
+        if self._requires_yield():
+            def _f():
+                # a target which is not a generator function runs to its end here and cannot be suspended
+                self._in_plain_target = True
+                try:
+                    r = func(*args, **kwargs)
+                finally:
+                    self._in_plain_target = False
+                if inspect.isgenerator(r):
+                    yield from r
+        else:
+            def _f():
+                func(*args, **kwargs)
+                self._loop_fiber.switch()
+
+        fb = self.fiber_class(target=_f)
         self._fibers.append(fb)
 
     @classmethod
     def await_ps(cls, ps):
         self = cls.get()
-        fb = Fiber.current()
+        fb = self.fiber_class.current()
 
         def _callback(ps):
             self._fibers.append(fb)
 
         cls.watch_ps(ps, _callback)
-        self._loop_fiber.switch()
+        return self._suspend()
 
     @classmethod
     def await_all_ps(cls, ps_set):
         self = cls.get()
-        fb = Fiber.current()
+        fb = self.fiber_class.current()
 
         def _callback(pss):
             self._fibers.append(fb)
 
         cls.watch_all_ps(ps_set, _callback)
-        self._loop_fiber.switch()
+        return self._suspend()
 
     @classmethod
     def await_task(cls, task):
         self = cls.get()
-        fb = Fiber.current()
+        fb = self.fiber_class.current()
 
         def _callback(ps):
             self._fibers.append(fb)
 
         cls.watch_task(task, _callback)
-        self._loop_fiber.switch()
+        return self._suspend()
 
     @classmethod
     def await_all_tasks(cls, tasks):
         self = cls.get()
-        fb = Fiber.current()
+        fb = self.fiber_class.current()
 
         def _callback(ts):
             self._fibers.append(fb)
 
         cls.watch_all_tasks(tasks, _callback)
+        return self._suspend()
+
+    def _requires_yield(self):
+        return getattr(self.fiber_class, 'requires_yield', False)
+
+    def _suspend(self):
+        if self._in_plain_target:
+            raise RuntimeError("with the generator fiber backend, the target of Server.async_ must be a generator "
+                               "function which yields the value of Server.await_*")
+        if self.metrics is not None:
+            self.metrics.count("fiber_switches")
+        if self._requires_yield():
+            return self._loop_fiber  # to be yielded by the calling generator fiber
         self._loop_fiber.switch()
 
     def _loop(self):
+        self._connect()
         self._launch_all_fibers()
+        self._exec_callback()
         self._submit_all()
+        self._flush_tasks()
         self._logger.debug("start polling")
-        t = self._receive_result()
-        while t:
-            self._exec_callback_for_task(t)
-            self._exec_callback_for_all_task(t)
-            if isinstance(t, Run):
-                ps = t.parameter_set()
-                if ps.is_finished():
-                    self._exec_callback()
+        tasks = self._receive_results()
+        while tasks or self._reconnect():
+            for t in tasks:
+                self._result_received(t)
+            self._exec_callback()
             self._submit_all()
-            t = self._receive_result()
+            for _ in range(len(tasks) - 1):
+                self._print_tasks([])  # the scheduler expects a reply for each result
+            self._flush_tasks()
+            if self.metrics is not None:
+                self.metrics.maybe_flush()
+            tasks = self._receive_results()
+        if self._transport is not None:
+            self._transport.disconnect()
+        Tables.get().flush_journal()
+        if self.result_cache is not None:
+            self.result_cache.commit()
+        if self.metrics is not None:
+            self.metrics.flush()
 
     def _default_logger(self):
         logger = logging.getLogger(__name__)
@@ -163,104 +251,324 @@ class Server(object):
         return (len(self.observed_ps) + len(self.observed_all_ps)) > 0
 
     def _has_unfinished_tasks(self):
-        for r in Task.all()[:self.max_submitted_task_id]:
-            if not r.is_finished():
-                return True
-        return False
+        return self._num_in_flight > 0 or len(self._queued) > 0
+
+    def _has_tasks_to_submit(self):
+        return len(self._queued) > 0 or len(Task.all()) > self.max_submitted_task_id
+
+    def _reprioritize(self, task):
+        if task.id in self._queued:
+            self._queued[task.id] = task.priority
+            heapq.heappush(self._pending, (-task.priority, task.id, task))
+
+    def _enqueue_new_tasks(self):
+        # returns True if the results of some tasks are found in the result cache
+        all_tasks = Task.all()
+        new_tasks = all_tasks[self.max_submitted_task_id:]
+        self.max_submitted_task_id = len(all_tasks)
+        found = False
+        for t in new_tasks:
+            if self.result_cache is not None and not t.is_finished() and self.result_cache.load_result(t):
+                self._logger.debug("found the result of Task %d in the cache" % t.id)
+                self._task_finished(t)
+                found = True
+                continue
+            self._queued[t.id] = t.priority
+            heapq.heappush(self._pending, (-t.priority, t.id, t))
+        return found
 
     def _submit_all(self):
-        tasks_to_be_submitted = [t for t in Task.all()[self.max_submitted_task_id:] if not t.is_finished()]
-        self._logger.debug("submitting %d Tasks" % len(tasks_to_be_submitted))
+        while self._enqueue_new_tasks():
+            self._exec_callback()
+        if self.max_in_flight is None:
+            capacity = len(self._queued)
+        else:
+            capacity = self.max_in_flight - self._num_in_flight
+        tasks_to_be_submitted = []
+        while self._pending and len(tasks_to_be_submitted) < capacity:
+            neg_priority, tid, t = heapq.heappop(self._pending)
+            if self._queued.get(tid) != -neg_priority:
+                continue  # already submitted or re-prioritized
+            del self._queued[tid]
+            if not t.is_finished():
+                tasks_to_be_submitted.append(t)
+        self._num_in_flight += len(tasks_to_be_submitted)
+        self._update_window_stats()
+        self._logger.debug("submitting %d Tasks (in flight: %d, pending: %d)" % (
+            len(tasks_to_be_submitted), self._num_in_flight, len(self._queued)))
+        if self.metrics is not None:
+            self._record_submission(len(tasks_to_be_submitted))
         self._print_tasks(tasks_to_be_submitted)
-        self.max_submitted_task_id = len(Task.all())
+
+    def _record_submission(self, n):
+        m = self.metrics
+        m.count("tasks_submitted", n)
+        m.observe("submit_batch_size", n, SIZE_BUCKETS)
+        m.set("tasks_in_flight", self._num_in_flight)
+        m.set("tasks_pending", len(self._queued))
+
+    def _update_window_stats(self):
+        stats = self._window_stats
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], self._num_in_flight)
+        if self.max_in_flight is not None:
+            stats["occupancy_sum"] += self._num_in_flight / self.max_in_flight
+            stats["num_samples"] += 1
+
+    def in_flight_stats(self):
+        stats = self._window_stats
+        n = stats["num_samples"]
+        return {
+            "in_flight": self._num_in_flight,
+            "pending": len(self._queued),
+            "max_in_flight": self.max_in_flight,
+            "peak_in_flight": stats["peak_in_flight"],
+            "mean_occupancy": stats["occupancy_sum"] / n if n > 0 else None
+        }
 
     def _print_tasks(self, tasks):
-        for t in tasks:
-            line = "%d %s\n" % (t.id, t.command)
-            self._out.write(line)
-        self._out.write("\n")
+        # the replies to a batch of results are written at once by _flush_tasks
+        self._out_buf.append(self._protocol.encode_tasks(tasks))
+
+    def _flush_tasks(self):
+        if not self._out_buf:
+            return
+        data = self._protocol.empty.join(self._out_buf)
+        self._out_buf.clear()
+        try:
+            self._out.write(data)
+            self._out.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            if not self._can_reconnect():
+                raise
+            self._logger.debug("failed to send tasks. the scheduler has disconnected")
+
+    def _connect(self):
+        self._protocol = get_protocol(self.binary_protocol)
+        if self._transport is not None:
+            self._logger.debug("waiting for the scheduler to connect")
+            self._in_fd, self._out = self._transport.connect(self._protocol.binary)
+            self._in_buf.clear()
+            self._in_closed = False
+        self._handshake()
+
+    def _can_reconnect(self):
+        return self._transport is not None and self._transport.reconnectable
+
+    def _reconnect(self):
+        # called when the scheduler closed the connection.
+        # If the search is not finished, the tasks in flight are submitted again after reconnection.
+        if not (self._can_reconnect() and (self._num_in_flight > 0 or self._has_tasks_to_submit())):
+            return False
+        self._logger.info("the scheduler has disconnected. %d tasks in flight are requeued" % self._num_in_flight)
+        self._requeue_in_flight_tasks()
+        self._out_buf.clear()
+        self._connect()
+        return True
+
+    def _requeue_in_flight_tasks(self):
+        for t in Tables.get().unfinished_tasks():
+            if t.id < self.max_submitted_task_id and t.id not in self._queued:
+                self._queued[t.id] = t.priority
+                heapq.heappush(self._pending, (-t.priority, t.id, t))
+        self._num_in_flight = 0
+
+    def _handshake(self):
+        if not self._protocol.binary:
+            return
+        self._out.write(HANDSHAKE)
+        self._out.flush()
+        self._accept_handshake(self._read_message(self._line_end))
+
+    def _accept_handshake(self, reply):
+        # the scheduler echoes HANDSHAKE to use the binary protocol. Any other line falls back to the text protocol.
+        if reply == HANDSHAKE:
+            return
+        self._logger.info("the scheduler declined the binary protocol: %r. using the text protocol" % bytes(reply[:64]))
+        self._protocol = get_protocol(False)
+        self._out = io.TextIOWrapper(self._out, encoding='utf-8')
 
     def _launch_all_fibers(self):
         while self._fibers:
             f = self._fibers.pop(0)
             self._logger.debug("starting fiber")
+            if self.metrics is not None:
+                self.metrics.count("fiber_switches")
             f.switch()
 
-    def _exec_callback(self):
-        while self._check_completed_ps() or self._check_completed_ps_all():
-            pass
+    def _result_received(self, task):
+        self._num_in_flight -= 1
+        if self.metrics is not None:
+            self.metrics.count("results_received")
+        if self.result_cache is not None:
+            self.result_cache.save_result(task)
+        self._task_finished(task)
+
+    def _task_finished(self, task):
+        self._events.append((self._dispatch_task, task))
+        if isinstance(task, Run):
+            ps = task.parameter_set()
+            if ps.is_finished():
+                self._events.append((self._dispatch_ps, ps))
 
-    def _check_completed_ps(self):
-        executed = False
-        for psid in list(self.observed_ps.keys()):
-            callbacks = self.observed_ps[psid]
-            ps = ParameterSet.find(psid)
-            while ps.is_finished() and len(callbacks) > 0:
-                self._logger.debug("executing callback for ParameterSet %d" % ps.id)
-                f = callbacks.pop(0)
-                f(ps)
-                self._launch_all_fibers()
-                executed = True
-        empty_keys = [k for k, v in self.observed_ps.items() if len(v) == 0]
-        for k in empty_keys:
-            self.observed_ps.pop(k)
-        return executed
+    def _exec_callback(self):
+        if self.metrics is not None:
+            return self._exec_callback_timed()
+        while self._events:
+            handler, arg = self._events.popleft()
+            handler(arg)
+
+    def _exec_callback_timed(self):
+        m = self.metrics
+        while self._events:
+            handler, arg = self._events.popleft()
+            t0 = time.perf_counter()
+            handler(arg)
+            m.observe("dispatch_seconds", time.perf_counter() - t0, kind=handler.__name__[len("_dispatch_"):])
+
+    def _dispatch_task(self, task):
+        self._exec_callback_for_task(task)
+        self._exec_callback_for_all_task(task)
+
+    def _dispatch_ps(self, ps):
+        callbacks = self.observed_ps.get(ps.id)
+        while callbacks and ps.is_finished():
+            self._logger.debug("executing callback for ParameterSet %d" % ps.id)
+            f = callbacks.pop(0)
+            f(ps)
+            self._launch_all_fibers()
+        if callbacks is not None and len(callbacks) == 0:
+            self.observed_ps.pop(ps.id, None)
+        if ps.is_finished():
+            for g in self.observed_all_ps.pop(ps.id, []):
+                g.remaining -= 1
+                if g.remaining == 0:
+                    self._events.append((self._dispatch_ps_group, g))
+
+    def _dispatch_ps_group(self, g):
+        # a ParameterSet may get new runs after it was counted as finished
+        if self._wait_for_ps_group(g):
+            return
+        psids = tuple(ps.id for ps in g.members)
+        self._logger.debug("executing callback for ParameterSet %s" % repr(psids))
+        g.callback(g.members)
+        self._launch_all_fibers()
 
-    def _check_completed_ps_all(self):
-        executed = False
-        for psids in list(self.observed_all_ps.keys()):
-            pss = [ParameterSet.find(psid) for psid in psids]
-            callbacks = self.observed_all_ps[psids]
-            while len(callbacks) > 0 and all([ps.is_finished() for ps in pss]):
-                self._logger.debug("executing callback for ParameterSet %s" % repr(psids))
-                f = callbacks.pop(0)
-                f(pss)
-                self._launch_all_fibers()
-                executed = True
-        empty_keys = [k for k, v in self.observed_all_ps.items() if len(v) == 0]
-        for k in empty_keys: self.observed_all_ps.pop(k)
-        return executed
+    def _wait_for_ps_group(self, g):
+        unfinished = [ps for ps in g.members if not ps.is_finished()]
+        g.remaining = len(unfinished)
+        for ps in unfinished:
+            self.observed_all_ps[ps.id].append(g)
+        return g.remaining > 0
 
     def _exec_callback_for_task(self, task):
         executed = False
-        callbacks = self.observed_task[task.id]
+        callbacks = self.observed_task.get(task.id, [])
         while len(callbacks) > 0:
             self._logger.debug("executing callback for Task %d" % task.id)
             f = callbacks.pop(0)
             f(task)
             self._launch_all_fibers()
             executed = True
-        self.observed_task.pop(task.id)
+        self.observed_task.pop(task.id, None)
         return executed
 
     def _exec_callback_for_all_task(self, task):
         executed = False
-        callback_pairs = self.observed_all_tasks[task.id]
-        to_be_removed = []
-        for (idx, pair) in enumerate(callback_pairs):
-            task_ids = pair[0]
-            if all([Task.find(t).is_finished() for t in task_ids]):
-                self._logger.debug("executing callback for Tasks %s" % str(task_ids))
-                f = pair[1]
-                f(Task.find(t) for t in task_ids)
-                to_be_removed.append(idx)
-                self._launch_all_fibers()
+        for g in self.observed_all_tasks.pop(task.id, []):
+            g.remaining -= 1
+            if g.remaining == 0:
+                self._events.append((self._dispatch_task_group, g))
                 executed = True
-        for idx in to_be_removed:
-            callback_pairs.pop(idx)
-        if len(callback_pairs) == 0:
-            self.observed_all_tasks.pop(task.id)
         return executed
 
+    def _dispatch_task_group(self, g):
+        task_ids = tuple(t.id for t in g.members)
+        self._logger.debug("executing callback for Tasks %s" % str(task_ids))
+        g.callback(g.members)
+        self._launch_all_fibers()
+
+    def _receive_results(self):
+        if self._in_closed:
+            return []
+        t = self._receive_result()
+        if t is None:
+            self._in_closed = True
+            return []
+        tasks = [t]
+        deadline = time.monotonic() + self.batch_latency
+        while len(tasks) < self.batch_size:
+            timeout = max(deadline - time.monotonic(), 0.0)
+            if not self._has_pending_input(timeout):
+                break
+            t = self._receive_result()
+            if t is None:
+                self._in_closed = True
+                break
+            tasks.append(t)
+        self._logger.debug("received %d results" % len(tasks))
+        if self.metrics is not None:
+            self.metrics.observe("receive_batch_size", len(tasks), SIZE_BUCKETS)
+        return tasks
+
+    def _input_waited(self, t0):
+        # time blocked on the input since t0
+        if self.metrics is not None:
+            self.metrics.count("input_wait_seconds", time.perf_counter() - t0)
+
+    def _has_pending_input(self, timeout):
+        if self._protocol.message_end(self._in_buf) >= 0:
+            return True
+        t0 = time.perf_counter()
+        readable, _, _ = select.select([self._in_fd], [], [], timeout)
+        self._input_waited(t0)
+        if not readable:
+            return False
+        chunk = self._read_chunk()
+        if not chunk:
+            return True  # EOF is reported by _read_message
+        self._in_buf += chunk
+        return self._protocol.message_end(self._in_buf) >= 0
+
+    @staticmethod
+    def _line_end(buf):
+        idx = buf.find(b"\n")
+        return idx + 1 if idx >= 0 else -1
+
+    def _read_message(self, message_end=None):
+        # returns the rest of the input at EOF
+        message_end = message_end or self._protocol.message_end
+        buf = self._in_buf
+        end = message_end(buf)
+        while end < 0:
+            chunk = self._read_chunk()
+            if not chunk:
+                msg = bytes(buf)
+                buf.clear()
+                return msg
+            buf += chunk
+            end = message_end(buf)
+        msg = bytes(buf[:end])
+        del buf[:end]
+        return msg
+
+    def _read_chunk(self):
+        t0 = time.perf_counter()
+        try:
+            return os.read(self._in_fd, 65536)
+        except ConnectionResetError:
+            return b""
+        finally:
+            self._input_waited(t0)
+
     def _receive_result(self):
-        line = sys.stdin.readline()
-        if not line: return None
-        line = line.rstrip()
-        self._logger.debug("received: %s" % line)
-        if not line: return None
-        l = line.split(' ')
-        tid, rc, place_id, start_at, finish_at = [int(x) for x in l[:5]]
-        results = [float(x) for x in l[5:]]
+        msg = self._read_message()
+        if not msg: return None
+        return self._store_result_message(msg)
+
+    def _store_result_message(self, msg):
+        r = self._protocol.decode_result(msg)
+        if r is None: return None
+        tid, results, rc, place_id, start_at, finish_at = r
         t = Task.find(tid)
         t.store_result(results, rc, place_id, start_at, finish_at)
         self._logger.debug("stored result of Task %d" % tid)
@@ -269,3 +577,10 @@ class Server(object):
     def _debug(self):
         sys.stderr.write(str(self.observed_ps) + "\n")
         sys.stderr.write(str(self.observed_all_ps) + "\n")
+
+
+class _Group:
+    def __init__(self, members, callback):
+        self.members = members  # list of ParameterSets or Tasks
+        self.callback = callback
+        self.remaining = 0  # number of members which are not finished yet
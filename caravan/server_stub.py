@@ -1,77 +1,106 @@
 from .server import Server
 from .task import Task
-import bisect
+from .run import Run
+from . import tables
+import heapq
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 
 class EventQueue:
     def __init__(self, num_places):
         self.n = num_places
-        self.sleeping_places = list(range(self.n))
-        self.running_tasks = []
-        self.finish_at_list = []
+        self.sleeping_places = deque(range(self.n))
+        self.running_tasks = []  # heap of (finish_at, seq, task)
         self.t = 0
-        self.tasks = []
+        self.tasks = deque()
+        self._seq = 0  # tasks finishing at the same time are popped in the order of start
 
-    def push_all(self, tasks):
-        self.tasks.extend(tasks)
+    def push_all(self, tasks, dts=None):
+        # dts: durations of the tasks. `t.dt` is used when omitted.
+        if dts is None:
+            dts = [t.dt for t in tasks]
+        self.tasks.extend(zip(tasks, dts))
 
     def pop(self):
-        while len(self.sleeping_places) > 0 and len(self.tasks) > 0:
-            place = self.sleeping_places.pop(0)
-            starting = self.tasks.pop(0)
+        while self.sleeping_places and self.tasks:
+            place = self.sleeping_places.popleft()
+            starting, dt = self.tasks.popleft()
             starting.start_at = self.t
-            starting.finish_at = self.t + starting.dt
+            starting.finish_at = self.t + dt
             starting.place_id = place
-            f = starting.finish_at
-            idx = bisect.bisect_right(self.finish_at_list, f)
-            self.finish_at_list.insert(idx, f)
-            self.running_tasks.insert(idx, starting)
+            heapq.heappush(self.running_tasks, (starting.finish_at, self._seq, starting))
+            self._seq += 1
 
         if len(self.sleeping_places) == self.n:
             return None
         else:
-            self.finish_at_list.pop(0)
-            next_task = self.running_tasks.pop(0)
+            _, _, next_task = heapq.heappop(self.running_tasks)
             self.t = next_task.finish_at
             p = next_task.place_id
             self.sleeping_places.append(p)
             return next_task
 
 
-_queue = None
-_stub_simulator = None
-
-
-def start_stub(stub_simulator, num_proc=1, logger=None, dump_path='tasks.bin'):
-    global _queue, _stub_simulator
-    _stub_simulator = stub_simulator
-    Server._instance = Server(logger)
-    _queue = EventQueue(num_proc)
-
-    # override the methods
-    def print_tasks_stub(self, tasks):
-        for t in tasks:
-            res, dt = _stub_simulator(t)
+def _evaluate_chunk(stub_simulator, items):
+    # items are (task, ParameterSet or None). ParameterSets are given when running in another process
+    # so that Run.parameter_set() works there.
+    outputs = []
+    for t, ps in items:
+        if ps is not None:
+            ps_table = tables.Tables.get().ps_table
+            if len(ps_table) <= ps.id:
+                ps_table.extend([None] * (ps.id + 1 - len(ps_table)))
+            ps_table[ps.id] = ps
+        outputs.append(stub_simulator(t))
+    return outputs
+
+
+class _StubServer(Server):
+    def __init__(self, stub_simulator, num_proc, logger, dump_path, executor=None, chunksize=1, max_in_flight=None,
+                 result_cache=None, metrics=None):
+        super().__init__(logger, max_in_flight=max_in_flight, result_cache=result_cache, binary_protocol=False,
+                         metrics=metrics)
+        self._stub_simulator = stub_simulator
+        self._queue = EventQueue(num_proc)
+        self._dump_path = dump_path
+        self._executor = executor
+        self._chunksize = chunksize
+
+    def _print_tasks(self, tasks):
+        dts = []
+        for t, (res, dt) in zip(tasks, self._evaluate(tasks)):
             t.results = res
-            t.dt = int(1000 * dt)
-        _queue.push_all(tasks)
-
-    Server._print_tasks = print_tasks_stub
-
-    def receive_result_stub(self):
-        t = _queue.pop()
+            dts.append(int(1000 * dt))
+        self._queue.push_all(tasks, dts)
+
+    def _evaluate(self, tasks):
+        if self._executor is None:
+            return [self._stub_simulator(t) for t in tasks]
+        remote = isinstance(self._executor, ProcessPoolExecutor)
+        items = [(t, t.parameter_set() if remote and isinstance(t, Run) else None) for t in tasks]
+        n = self._chunksize
+        futures = [self._executor.submit(_evaluate_chunk, self._stub_simulator, items[i:i + n])
+                   for i in range(0, len(items), n)]
+        return [out for f in futures for out in f.result()]
+
+    def _receive_result(self):
+        t = self._queue.pop()
         if t is None:
             return None
-        t.rc = 0
+        t.store_result(t.results, 0, t.place_id, t.start_at, t.finish_at)
         return t
 
-    Server._receive_result = receive_result_stub
-
-    Server.org_exit = Server.__exit__
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        Task.dump_binary(self._dump_path)
 
-    def _exit(self, exc_type, exc_val, exc_tb):
-        self.org_exit(exc_type, exc_val, exc_tb)
-        Task.dump_binary(dump_path)
 
-    Server.__exit__ = _exit
+def start_stub(stub_simulator, num_proc=1, logger=None, dump_path='tasks.bin', executor=None, chunksize=1,
+               max_in_flight=None, resume_from=None, result_cache=None, metrics=None):
+    # stub_simulator is called in parallel when a concurrent.futures executor is given.
+    # For a ProcessPoolExecutor, stub_simulator and tasks must be picklable.
+    Server._load_tables(resume_from)
+    Server._instance = _StubServer(stub_simulator, num_proc, logger, dump_path, executor, chunksize,
+                                   max_in_flight, result_cache, metrics)
     return Server._instance
@@ -0,0 +1,150 @@
+import math
+import numbers
+import heapq
+import itertools
+from collections import defaultdict
+
+
+class GridIndex:
+    # Buckets of the ParameterSets whose params are finite numbers, in a regular grid over the parameter space.
+    # The distance is the Euclidean distance of the params.
+    # cell_size is a number or a sequence of numbers per dimension. When it is None, it is chosen from the points
+    # given at construction, and needs_rebuild() tells when the number of points has grown enough to choose again.
+
+    def __init__(self, points=(), cell_size=None):
+        points = [(i, p) for (i, p) in points if _is_numeric(p)]
+        self.dim = len(points[0][1]) if points else None
+        self.auto_cell_size = cell_size is None
+        if cell_size is None:
+            cell_size = self._choose_cell_size([p for (_, p) in points if len(p) == self.dim])
+        self.cell_size = cell_size
+        self._sizes = None
+        self._cells = defaultdict(list)  # (cell) => list of (ps_id, params)
+        self._size = 0
+        self._built_size = len(points)
+        for i, p in points:
+            self.add(i, p)
+
+    def __len__(self):
+        return self._size
+
+    def needs_rebuild(self):
+        return self.auto_cell_size and self._size > 4 * max(self._built_size, 16)
+
+    def add(self, ps_id, params):
+        # params which are not finite numbers or whose dimension differs from the first ones are not indexed
+        if not _is_numeric(params):
+            return False
+        if self.dim is None:
+            self.dim = len(params)
+        if len(params) != self.dim:
+            return False
+        self._cells[self._cell_of(params)].append((ps_id, params))
+        self._size += 1
+        return True
+
+    def nearest(self, point, k=1):
+        # returns a list of (distance, ps_id) of the k nearest points, nearest first.
+        # Cells are visited in the order of their distance from the point until they are farther than the k-th point.
+        if self._size == 0 or k <= 0:
+            return []
+        if not _is_numeric(point):
+            raise ValueError("point must be finite numbers: %s" % (point,))
+        sizes = self._cell_sizes()
+        start = self._cell_of(point)
+        frontier = [(0.0, start)]
+        visited = {start}
+        found = []  # heap of (-distance, -ps_id) of the k nearest points so far
+        max_visits = 8 * len(self._cells)
+        while frontier:
+            lower_bound, c = heapq.heappop(frontier)
+            if len(found) == k and lower_bound > -found[0][0]:
+                break
+            if len(visited) > max_visits:
+                # the points are sparse around the point. scanning all the points is cheaper
+                found = [(-_distance(point, p), -i) for ps in self._cells.values() for (i, p) in ps]
+                break
+            for (i, p) in self._cells.get(c, ()):
+                item = (-_distance(point, p), -i)
+                if len(found) < k:
+                    heapq.heappush(found, item)
+                elif item > found[0]:
+                    heapq.heapreplace(found, item)
+            for d in range(self.dim):
+                for step in (-1, 1):
+                    n = c[:d] + (c[d] + step,) + c[d + 1:]
+                    if n not in visited:
+                        visited.add(n)
+                        heapq.heappush(frontier, (_cell_distance(point, n, sizes), n))
+        return sorted((-d, -i) for (d, i) in found)[:k]
+
+    def in_range(self, lo, hi):
+        # returns the ids of the points in the box lo <= params <= hi, in ascending order.
+        # lo and hi may be infinite for an open-ended box.
+        if self._size == 0:
+            return []
+        sizes = self._cell_sizes()
+        clo = tuple(_cell_coord(x, s) for x, s in zip(lo, sizes))
+        chi = tuple(_cell_coord(x, s) for x, s in zip(hi, sizes))
+        num_cells = None
+        if _is_numeric(lo) and _is_numeric(hi):
+            num_cells = 1
+            for a, b in zip(clo, chi):
+                num_cells *= max(b - a + 1, 0)
+        if num_cells is None or num_cells > len(self._cells):
+            cells = [c for c in self._cells if all(a <= x <= b for x, a, b in zip(c, clo, chi))]
+        else:
+            cells = itertools.product(*[range(a, b + 1) for a, b in zip(clo, chi)])
+        ids = []
+        for c in cells:
+            for (i, p) in self._cells.get(c, ()):
+                if all(a <= x <= b for x, a, b in zip(p, lo, hi)):
+                    ids.append(i)
+        ids.sort()
+        return ids
+
+    def _cell_sizes(self):
+        if self._sizes is None:
+            s = self.cell_size
+            self._sizes = [float(x) for x in s] if hasattr(s, '__len__') else [float(s)] * self.dim
+        return self._sizes
+
+    def _cell_of(self, p):
+        return tuple(math.floor(x / s) for x, s in zip(p, self._cell_sizes()))
+
+    def _choose_cell_size(self, points):
+        # about two points per cell if the points were uniformly distributed
+        if len(points) < 2:
+            return 1.0
+        n = (len(points) / 2.0) ** (1.0 / self.dim)
+        sizes = []
+        for d in range(self.dim):
+            xs = [p[d] for p in points]
+            extent = max(xs) - min(xs)
+            sizes.append(extent / n if extent > 0 and n > 1 else 1.0)
+        return sizes
+
+
+def _is_numeric(params):
+    return all(isinstance(x, numbers.Real) and math.isfinite(x) for x in params)
+
+
+def _cell_coord(x, s):
+    # infinite and NaN bounds are kept as they are so that they compare with the cells
+    return math.floor(x / s) if math.isfinite(x) else x
+
+
+def _distance(a, b):
+    return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+
+
+def _cell_distance(point, cell, sizes):
+    # distance from the point to the nearest point of the cell
+    d2 = 0.0
+    for x, c, s in zip(point, cell, sizes):
+        lo = c * s
+        if x < lo:
+            d2 += (lo - x) ** 2
+        elif x > lo + s:
+            d2 += (x - lo - s) ** 2
+    return math.sqrt(d2)
@@ -0,0 +1,288 @@
+import pickle
+import sqlite3
+import hashlib
+import numbers
+import weakref
+from collections import OrderedDict, defaultdict, deque
+from .tables import Tables
+
+
+class SqliteTables(Tables):
+    # Tables stored in a SQLite database for the searches whose tasks do not fit in memory.
+    #
+    #   SqliteTables.open("tables.db")
+    #   ... # ParameterSet.find_or_create, Task.find, Run.all, etc. work as usual
+    #   Tables.get().close()
+    #
+    # Only the recently used ParameterSets and Tasks (at most cache_size of each) are kept in memory in addition
+    # to the ones referred from elsewhere. Modified objects are written to the database every commit_every
+    # changes and when the server finishes. Opening an existing database continues the search stored in it:
+    # the search script is replayed as with Server.start(resume_from=...), which is not used with SqliteTables.
+    # ParameterSets are looked up by a digest of their params, which is equal for equal params such as (1, 2) and
+    # (1.0, 2), and the candidates are compared with ==.
+
+    def __init__(self, path, cache_size=100000, commit_every=10000):
+        super().__init__()
+        self.path = path
+        self.cache_size = cache_size
+        self.commit_every = commit_every
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parameter_sets (id INTEGER PRIMARY KEY, params_key BLOB, obj BLOB)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS parameter_sets_params_key ON parameter_sets (params_key)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, type TEXT, ps_id INTEGER, finished INTEGER, "
+            "obj BLOB)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_ps_id ON tasks (ps_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_type ON tasks (type, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_unfinished ON tasks (id) WHERE finished = 0")
+        self.ps_table = _Table(self, "parameter_sets")
+        self.tasks_table = _Table(self, "tasks")
+        self.param_ps_dict = _ParamsIndex(self)
+        self._task_types = {}  # (type name) => class of the tasks
+        self._num_modified = 0
+
+    @classmethod
+    def open(cls, path, cache_size=100000, commit_every=10000):
+        if Tables._instance is not None:
+            Tables._instance.disable_journal()
+        Tables._instance = None
+        t = cls(path, cache_size, commit_every)
+        Tables._instance = t
+        if len(t.tasks_table) > 0:
+            t.begin_replay()
+        return t
+
+    def __getstate__(self):
+        raise TypeError("SqliteTables is saved in its database. call commit() instead of Tables.dump()")
+
+    def clear(self):
+        super().clear()
+        self._conn.execute("DELETE FROM parameter_sets")
+        self._conn.execute("DELETE FROM tasks")
+        self._conn.commit()
+        self.ps_table = _Table(self, "parameter_sets")
+        self.tasks_table = _Table(self, "tasks")
+        self.param_ps_dict = _ParamsIndex(self)
+        self._num_modified = 0
+
+    def add_ps(self, ps):
+        self.ps_table.add(ps)
+        self.param_ps_dict.add(ps)
+        self._index_ps(ps)
+        self._modified()
+
+    def add_ps_many(self, pss):
+        for ps in pss:
+            self.add_ps(ps)
+
+    def add_tasks(self, tasks):
+        for t in tasks:
+            self.add_task(t)
+
+    def add_task(self, task):
+        self._task_types[self._type_name(type(task))] = type(task)
+        self.tasks_table.add(task)
+        self._ps_modified(task)
+        self._modified()
+
+    def result_stored(self, task):
+        if self._is_registered(task):
+            self.tasks_table.mark_dirty(task)
+            self._ps_modified(task)
+            self._modified()
+
+    def priority_changed(self, task):
+        if self._is_registered(task):
+            self.tasks_table.mark_dirty(task)
+            self._modified()
+
+    def begin_replay(self):
+        # only the Tasks other than Runs are loaded to match them by their commands
+        from .run import Run
+        self.commit()
+        self._replay_runs = defaultdict(int)
+        self._replay_tasks = defaultdict(deque)
+        names = [name for name in self._stored_type_names() if not issubclass(self._class_of(name), Run)]
+        for t in self._tasks_of_type_names(names):
+            self._replay_tasks[t.command].append(t.id)
+
+    def _ps_modified(self, task):
+        ps_id = getattr(task, 'ps_id', None)
+        if ps_id is not None:
+            self.ps_table.mark_dirty(self.ps_table[ps_id])
+
+    def _modified(self):
+        self._num_modified += 1
+        if self._num_modified >= self.commit_every:
+            self.commit()
+
+    def tasks_of_type(self, cls):
+        self.commit()
+        return self._tasks_of_type_names([name for name in self._stored_type_names()
+                                          if issubclass(self._class_of(name), cls)])
+
+    def _stored_type_names(self):
+        return [name for (name,) in self._conn.execute("SELECT DISTINCT type FROM tasks")]
+
+    def _tasks_of_type_names(self, names):
+        marks = ",".join("?" * len(names))
+        rows = self._conn.execute("SELECT id FROM tasks WHERE type IN (%s) ORDER BY id" % marks, names)
+        return [self.tasks_table[i] for (i,) in rows.fetchall()]
+
+    def unfinished_tasks(self):
+        self.commit()
+        rows = self._conn.execute("SELECT id FROM tasks WHERE finished = 0 ORDER BY id")
+        return [self.tasks_table[i] for (i,) in rows]
+
+    def num_unfinished_tasks(self):
+        self.commit()
+        return self._conn.execute("SELECT COUNT(*) FROM tasks WHERE finished = 0").fetchone()[0]
+
+    def flush_journal(self):
+        self.commit()
+
+    def commit(self):
+        self.ps_table.write_dirty(
+            "INSERT OR REPLACE INTO parameter_sets VALUES (?, ?, ?)",
+            lambda ps: (ps.id, _params_key(ps.params), _dumps(ps)))
+        self.param_ps_dict.written()
+        self.tasks_table.write_dirty(
+            "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)",
+            lambda t: (t.id, self._type_name(type(t)), getattr(t, 'ps_id', None), int(t.is_finished()), _dumps(t)))
+        self._conn.commit()
+        self._num_modified = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    @staticmethod
+    def _type_name(cls):
+        return cls.__module__ + "." + cls.__qualname__
+
+    def _class_of(self, name):
+        c = self._task_types.get(name)
+        if c is None:
+            import importlib
+            module, qualname = name.rsplit(".", 1)
+            c = getattr(importlib.import_module(module), qualname)
+            self._task_types[name] = c
+        return c
+
+    def _load(self, table, i):
+        row = self._conn.execute("SELECT obj FROM %s WHERE id = ?" % table, (i,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+
+def _dumps(obj):
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _params_key(params):
+    return hashlib.sha1(_canonical(params).encode()).digest()
+
+
+def _canonical(x):
+    # a string which is the same for equal params. Unequal params may share it.
+    if isinstance(x, (tuple, list)):
+        return "(" + ",".join(_canonical(v) for v in x) + ")"
+    if isinstance(x, numbers.Real) and not isinstance(x, numbers.Integral):
+        x = float(x)
+        if x.is_integer():
+            return repr(int(x))
+    if isinstance(x, numbers.Integral):
+        return repr(int(x))
+    return repr(x)
+
+
+class _Table:
+    # list-like view of the ParameterSets or Tasks in the database, indexed by id.
+    # Objects are identical as long as they are referred from somewhere.
+
+    def __init__(self, tables, name):
+        self._tables = tables
+        self._name = name
+        self._objects = weakref.WeakValueDictionary()  # (id) => loaded object
+        self._lru = OrderedDict()  # (id) => recently used object
+        self._dirty = {}  # (id) => object not written to the database yet
+        self._len = tables._conn.execute("SELECT COUNT(*) FROM %s" % name).fetchone()[0]
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        obj = self._objects.get(i)
+        if obj is None:
+            if not 0 <= i < self._len:
+                raise IndexError("%s index out of range" % self._name)
+            obj = self._tables._load(self._name, i)
+            self._objects[i] = obj
+        self._touch(i, obj)
+        return obj
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    def add(self, obj):
+        if obj.id != self._len:
+            raise ValueError("id must be %d" % self._len)
+        self._len += 1
+        self._objects[obj.id] = obj
+        self._touch(obj.id, obj)
+        self.mark_dirty(obj)
+
+    def mark_dirty(self, obj):
+        self._dirty[obj.id] = obj
+
+    def write_dirty(self, sql, to_row):
+        if self._dirty:
+            self._tables._conn.executemany(sql, [to_row(obj) for obj in self._dirty.values()])
+            self._dirty = {}
+
+    def _touch(self, i, obj):
+        lru = self._lru
+        lru[i] = obj
+        lru.move_to_end(i)
+        if len(lru) > self._tables.cache_size:
+            lru.popitem(last=False)
+
+
+class _ParamsIndex:
+    # dict-like view from params to the ParameterSet
+
+    def __init__(self, tables):
+        self._tables = tables
+        self._new = {}  # (params) => ParameterSet not written to the database yet
+
+    def __contains__(self, params):
+        return self.get(params) is not None
+
+    def __getitem__(self, params):
+        ps = self.get(params)
+        if ps is None:
+            raise KeyError(params)
+        return ps
+
+    def get(self, params, default=None):
+        ps = self._new.get(params)
+        if ps is not None:
+            return ps
+        rows = self._tables._conn.execute(
+            "SELECT id FROM parameter_sets WHERE params_key = ? ORDER BY id", (_params_key(params),))
+        for (i,) in rows.fetchall():
+            ps = self._tables.ps_table[i]
+            if ps.params == params:
+                return ps
+        return default
+
+    def add(self, ps):
+        self._new[ps.params] = ps
+
+    def written(self):
+        self._new.clear()
@@ -1,4 +1,9 @@
+import os
 import pickle
+import heapq
+from collections import defaultdict, deque
+from .journal import Journal
+from .spatial_index import GridIndex
 
 
 class Tables:
@@ -16,21 +21,257 @@ class Tables:
         self.ps_table = []
         self.param_ps_dict = {}
         self.tasks_table = []
+        self._task_ids_by_type = defaultdict(list)  # (class) => ids of the tasks of exactly this class
+        self._unfinished_task_ids = {}  # ids of unfinished tasks, in the order of creation
+        self._spatial_index = None  # GridIndex over params. built on the first query
+        self._journal = None
+        self._snapshot_path = None
+        self._compact_every = None
+        self._replay_runs = None
+        self._replay_tasks = None
 
     def clear(self):
         self.ps_table = []
         self.param_ps_dict = {}
         self.tasks_table = []
+        self._task_ids_by_type = defaultdict(list)
+        self._unfinished_task_ids = {}
+        self._spatial_index = None
+        self._replay_runs = None
+        self._replay_tasks = None
+        if self._journal is not None:
+            self._journal.truncate()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_task_ids_by_type']
+        del state['_unfinished_task_ids']
+        state['_journal'] = None
+        state['_spatial_index'] = None
+        state['_replay_runs'] = None
+        state['_replay_tasks'] = None
+        return state
+
+    def __setstate__(self, state):
+        self._spatial_index = None
+        self._journal = None
+        self._snapshot_path = None
+        self._compact_every = None
+        self._replay_runs = None
+        self._replay_tasks = None
+        self.__dict__.update(state)
+        self._rebuild_indexes()
+        for ps in self.ps_table:
+            if ps._num_unfinished_runs is None or ps._counts is None:
+                ps._rebuild_aggregates(self.tasks_table)
+
+    def _rebuild_indexes(self):
+        self._task_ids_by_type = defaultdict(list)
+        self._unfinished_task_ids = {}
+        for t in self.tasks_table:
+            self._task_ids_by_type[type(t)].append(t.id)
+            if not t.is_finished():
+                self._unfinished_task_ids[t.id] = None
+
+    def add_ps(self, ps):
+        self.ps_table.append(ps)
+        self.param_ps_dict[ps.params] = ps
+        self._index_ps(ps)
+        self._record(('ps', ps.id, ps.params))
+
+    def add_ps_many(self, pss):
+        self.ps_table.extend(pss)
+        self.param_ps_dict.update((ps.params, ps) for ps in pss)
+        for ps in pss:
+            self._index_ps(ps)
+        if self._journal is not None:
+            for ps in pss:
+                self._record(('ps', ps.id, ps.params))
+
+    def add_task(self, task):
+        self.tasks_table.append(task)
+        self._task_ids_by_type[type(task)].append(task.id)
+        if not task.is_finished():
+            self._unfinished_task_ids[task.id] = None
+        if self._journal is not None:
+            self._record(task._journal_record())
+
+    def add_tasks(self, tasks):
+        # tasks are unfinished and of the same class
+        if not tasks:
+            return
+        self.tasks_table.extend(tasks)
+        ids = [t.id for t in tasks]
+        self._task_ids_by_type[type(tasks[0])].extend(ids)
+        self._unfinished_task_ids.update(dict.fromkeys(ids))
+        if self._journal is not None:
+            for t in tasks:
+                self._record(t._journal_record())
+
+    def result_stored(self, task):
+        if not self._is_registered(task):
+            return
+        self._unfinished_task_ids.pop(task.id, None)
+        if self._journal is not None:
+            self._record(('result', task.id, task.results, task.rc, task.place_id, task.start_at, task.finish_at))
+
+    def priority_changed(self, task):
+        if self._journal is not None and self._is_registered(task):
+            self._record(('priority', task.id, task.priority))
+
+    def spatial_index(self, cell_size=None):
+        # built on the first call and updated as ParameterSets are added. Given cell_size rebuilds the index.
+        idx = self._spatial_index
+        if idx is None or (cell_size is not None and cell_size != idx.cell_size):
+            idx = GridIndex([(ps.id, ps.params) for ps in self.ps_table], cell_size)
+            self._spatial_index = idx
+        return idx
+
+    def _index_ps(self, ps):
+        idx = self._spatial_index
+        if idx is not None:
+            idx.add(ps.id, ps.params)
+            if idx.needs_rebuild():
+                self._spatial_index = None
+
+    def tasks_of_type(self, cls):
+        # tasks which are instances of cls, in the order of id
+        id_lists = [ids for (c, ids) in self._task_ids_by_type.items() if issubclass(c, cls)]
+        if len(id_lists) == 1:
+            ids = id_lists[0]
+        else:
+            ids = heapq.merge(*id_lists)
+        return [self.tasks_table[i] for i in ids]
+
+    def unfinished_tasks(self):
+        return [self.tasks_table[i] for i in self._unfinished_task_ids]
+
+    def num_unfinished_tasks(self):
+        return len(self._unfinished_task_ids)
+
+    def _is_registered(self, task):
+        return task.id < len(self.tasks_table) and self.tasks_table[task.id] is task
+
+    # replay: when a search script is run again on the loaded tables, Task.create and Run.create return
+    # the existing tasks in the order they were created instead of creating new ones.
+    # Runs are matched per ParameterSet and Tasks are matched by their command.
+    def begin_replay(self):
+        from .run import Run
+        self._replay_runs = defaultdict(int)  # (ps_id) => number of runs created by the script
+        self._replay_tasks = defaultdict(deque)  # (command) => ids of Tasks not created by the script yet
+        for t in self.tasks_table:
+            if not isinstance(t, Run):
+                self._replay_tasks[t.command].append(t.id)
+
+    def is_replaying(self):
+        return self._replay_runs is not None
+
+    def replayed_run(self, ps):
+        if self._replay_runs is None:
+            return None
+        n = self._replay_runs[ps.id]
+        self._replay_runs[ps.id] = n + 1
+        if n < len(ps.run_ids):
+            return self.tasks_table[ps.run_ids[n]]
+        return None
+
+    def num_created_runs(self, ps):
+        if self._replay_runs is None:
+            return len(ps.run_ids)
+        return self._replay_runs[ps.id]
+
+    def replayed_task(self, command):
+        if self._replay_tasks is None:
+            return None
+        ids = self._replay_tasks.get(command)
+        if ids:
+            return self.tasks_table[ids.popleft()]
+        return None
+
+    # journal: the changes after the last snapshot are appended to `<snapshot path>.journal`.
+    # Tables.load(path) loads the snapshot and replays the journal.
+    @classmethod
+    def enable_journal(cls, path, flush_every=1000, compact_every=None):
+        self = cls.get()
+        self.disable_journal()
+        self._snapshot_path = path
+        self._compact_every = compact_every
+        self._journal = Journal(path + ".journal", flush_every)
+
+    def disable_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def flush_journal(self):
+        if self._journal is not None:
+            self._journal.flush()
+
+    def checkpoint(self):
+        # write a snapshot and truncate the journal
+        self.__class__.dump(self._snapshot_path)
+
+    def _record(self, record):
+        j = self._journal
+        if j is None:
+            return
+        j.append(record)
+        if self._compact_every is not None and len(j) >= self._compact_every:
+            self.checkpoint()
+
+    def _replay(self, records):
+        from .parameter_set import ParameterSet
+        from .task import Task
+        from .run import Run
+        journal, self._journal = self._journal, None
+        try:
+            for r in records:
+                kind = r[0]
+                if kind == 'ps':
+                    if r[1] == len(self.ps_table):
+                        self.add_ps(ParameterSet(r[1], r[2]))
+                elif kind == 'task':
+                    if r[1] == len(self.tasks_table):
+                        t = Task(r[1], r[2])
+                        t.priority = r[3]
+                        self.add_task(t)
+                elif kind == 'run':
+                    if r[1] == len(self.tasks_table):
+                        t = Run(r[1], r[2], r[3])
+                        t.priority = r[4]
+                        self.ps_table[t.ps_id]._add_run(t)
+                        self.add_task(t)
+                elif kind == 'priority':
+                    self.tasks_table[r[1]].priority = r[2]
+                elif kind == 'result':
+                    t = self.tasks_table[r[1]]
+                    if not t.is_finished():
+                        t.store_result(*r[2:])
+        finally:
+            self._journal = journal
 
     @classmethod
     def dump(cls, path):
-        with open(path, 'wb') as f:
-            pickle.dump(cls._instance, f)
+        self = cls.get()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        if self._journal is not None and path == self._snapshot_path:
+            self._journal.truncate()
 
     @classmethod
     def load(cls, path):
-        with open(path, 'rb') as f:
-            cls._instance = pickle.load(f)
+        journal_path = path + ".journal"
+        if os.path.exists(path) or not os.path.exists(journal_path):
+            with open(path, 'rb') as f:
+                cls._instance = pickle.load(f)
+        else:
+            cls._instance = None
+            cls.get()
+        if os.path.exists(journal_path):
+            cls._instance._replay(Journal.read(journal_path))
+        return cls._instance
 
     def dumps(self):
         ps_str = ",\n".join([ps.dumps() for ps in self.ps_table])
@@ -1,9 +1,12 @@
+import os
 from collections import OrderedDict
 import json
 from . import tables
 
 
 class Task:
+    __slots__ = ('id', 'command', 'rc', 'place_id', 'start_at', 'finish_at', 'results', 'priority', '__weakref__')
+
     def __init__(self, task_id, command):
         self.id = task_id
         if command is not None:
@@ -13,25 +16,59 @@ class Task:
         self.start_at = None
         self.finish_at = None
         self.results = None
+        self.priority = 0  # tasks with higher priority are submitted first
 
     @classmethod
-    def create(cls, cmd):
+    def create(cls, cmd, priority=0):
         tab = tables.Tables.get()
+        t = tab.replayed_task(cmd)
+        if t is not None:
+            return t
         next_id = len(tab.tasks_table)
         t = cls(next_id, cmd)
-        tab.tasks_table.append(t)
+        t.priority = priority
+        tab.add_task(t)
         return t
 
     def is_finished(self):
         return not (self.rc is None)
 
     def store_result(self, results, rc, place_id, start_at, finish_at):
+        self._set_result(results, rc, place_id, start_at, finish_at)
+        tables.Tables.get().result_stored(self)
+
+    def _set_result(self, results, rc, place_id, start_at, finish_at):
         self.results = tuple(results)
         self.rc = rc
         self.place_id = place_id
         self.start_at = start_at
         self.finish_at = finish_at
 
+    def _journal_record(self):
+        return ('task', self.id, self.command, self.priority)
+
+    def __getstate__(self):
+        # read the slots directly since Run overrides `command` with a property
+        state = {}
+        for cls in type(self).__mro__:
+            for k in cls.__dict__.get('__slots__', ()):
+                if k == '__weakref__':
+                    continue
+                try:
+                    state[k] = cls.__dict__[k].__get__(self, cls)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        # accepts the states pickled before __slots__ were introduced
+        if isinstance(state, tuple):
+            d, slots = state
+            state = dict(d or {}, **(slots or {}))
+        self.priority = 0
+        for k, v in state.items():
+            setattr(self, k, v)
+
     def to_dict(self):
         o = OrderedDict()
         o["id"] = self.id
@@ -48,6 +85,13 @@ class Task:
         from .server import Server
         Server.watch_task(self, f)
 
+    def set_priority(self, priority):
+        from .server import Server
+        self.priority = priority
+        tables.Tables.get().priority_changed(self)
+        if Server._instance is not None:
+            Server._instance._reprioritize(self)
+
     @classmethod
     def all(cls):
         return tables.Tables.get().tasks_table
@@ -60,13 +104,68 @@ class Task:
         return json.dumps(self.to_dict())
 
     @classmethod
-    def dump_binary(cls, path):
+    def dump_binary(cls, path, chunk_size=65536):
+        # each finished task is written as a record of ">6q{n}d": id, rc, place_id, start_at, finish_at, n, results.
+        # Records are packed into a buffer and written every chunk_size tasks.
         import struct
+        structs = {}  # (number of results) => struct.Struct
+        buf = bytearray()
+        num_buffered = 0
         with open(path, 'wb') as f:
             for t in cls.all():
-                #print(t.dumps())
-                num_results = len(t.results)
-                fmt = ">6q{n:d}d".format(n=num_results)
-                bytes = struct.pack(fmt, t.id, t.rc, t.place_id, t.start_at, t.finish_at, len(t.results), *t.results)
-                f.write(bytes)
+                if not t.is_finished():
+                    continue
+                n = len(t.results)
+                st = structs.get(n)
+                if st is None:
+                    st = structs[n] = struct.Struct(">6q{n:d}d".format(n=n))
+                buf += st.pack(t.id, t.rc, t.place_id, t.start_at, t.finish_at, n, *t.results)
+                num_buffered += 1
+                if num_buffered >= chunk_size:
+                    f.write(buf)
+                    buf.clear()
+                    num_buffered = 0
+            f.write(buf)
             f.flush()
+
+    @staticmethod
+    def load_binary(path):
+        # reads a file written by dump_binary into a NumPy structured array with the fields
+        # id, rc, place_id, start_at, finish_at, num_results and results. Requires NumPy.
+        # When all the records have the same number of results, the array is a read-only view of the memory-mapped
+        # file. Otherwise `results` has the width of the longest record and is padded with NaN.
+        import numpy as np
+        header = [(k, '>i8') for k in ('id', 'rc', 'place_id', 'start_at', 'finish_at', 'num_results')]
+        size = os.path.getsize(path)
+        if size == 0:
+            return np.zeros(0, dtype=header + [('results', '>f8', (0,))])
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        n = int(raw[40:48].view('>i8')[0])
+        dtype = np.dtype(header + [('results', '>f8', (n,))])
+        if size % dtype.itemsize == 0:
+            records = raw.view(dtype)
+            if (records['num_results'] == n).all():
+                return records
+
+        # variable-length records: find the offsets of the records and gather the fields
+        import struct
+        read_n = struct.Struct('>q').unpack_from
+        offsets = []
+        pos = 0
+        while pos < size:
+            offsets.append(pos)
+            pos += 48 + 8 * read_n(raw, pos + 40)[0]
+        offsets = np.array(offsets, dtype=np.int64)
+        heads = raw[offsets[:, None] + np.arange(48)].view('>i8')
+        ns = heads[:, 5]
+        width = int(ns.max())
+        records = np.zeros(len(offsets), dtype=header + [('results', '>f8', (width,))])
+        for i, (k, _) in enumerate(header):
+            records[k] = heads[:, i]
+        results = np.full((len(offsets), width), np.nan)
+        for j in range(width):
+            has = ns > j
+            pos = offsets[has] + 48 + 8 * j
+            results[has, j] = raw[pos[:, None] + np.arange(8)].view('>f8')[:, 0]
+        records['results'] = results
+        return records
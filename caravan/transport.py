@@ -0,0 +1,129 @@
+import sys, os, socket, threading
+from .protocol import get_protocol
+
+
+def open_stdout(binary, fd=None):
+    fd = sys.stdout.fileno() if fd is None else fd
+    if binary:
+        return os.fdopen(fd, mode='wb')
+    return os.fdopen(fd, mode='w')  # block buffered. flushed by Server._flush_tasks
+
+
+class StdioTransport:
+    # the scheduler runs the search engine as its child process and talks to it via stdin/stdout
+    reconnectable = False
+
+    def __init__(self):
+        # taken before sys.stdout is redirected
+        self._in_fd = sys.stdin.fileno()
+        self._out_fd = sys.stdout.fileno()
+
+    def connect(self, binary):
+        # returns (file descriptor to read results from, file object to write tasks to)
+        return self._in_fd, open_stdout(binary, self._out_fd)
+
+    def disconnect(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SocketTransport:
+    # the search engine listens on a socket and the scheduler connects to it.
+    # `address` is a path for a Unix domain socket or (host, port) for TCP.
+    # When the scheduler disconnects before the search finishes, the server waits for it to connect again.
+    reconnectable = True
+
+    def __init__(self, address, buffer_size=1 << 20, backlog=1):
+        self.buffer_size = buffer_size
+        if isinstance(address, str):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if os.path.exists(address):
+                os.remove(address)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # set before listen() so that the accepted connections inherit them, and the TCP window is agreed on them
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self._sock.bind(address)
+        self._sock.listen(backlog)
+        self.address = self._sock.getsockname()  # the port is assigned here when 0 is given
+        self._conn = None
+        self._out = None
+
+    def connect(self, binary):
+        self.disconnect()
+        conn, _ = self._sock.accept()
+        self._conn = conn
+        self._out = conn.makefile('wb' if binary else 'w', buffering=self.buffer_size)
+        return conn.fileno(), self._out
+
+    def disconnect(self):
+        if self._conn is None:
+            return
+        try:
+            self._out.close()
+        except OSError:
+            pass  # the scheduler has gone
+        self._conn.close()
+        self._conn = None
+        self._out = None
+
+    def close(self):
+        self.disconnect()
+        self._sock.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class LocalScheduler:
+    # Stand-in for the CARAVAN scheduler, which connects to a SocketTransport and runs the tasks one by one
+    # in this process. `simulator(task_id, command)` returns the list of results.
+    # When `max_results` is given, the connection is closed after sending that many results, as if the
+    # scheduler were restarted.
+
+    def __init__(self, address, simulator, binary=False, max_results=None):
+        self.address = address
+        self.simulator = simulator
+        self.max_results = max_results
+        self.received = []  # ids of the received tasks
+        self.executed = []  # ids of the executed tasks
+        self._protocol = get_protocol(binary)
+        self._clock = 0
+
+    def run(self):
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.connect(self.address)
+            with sock.makefile('rb') as r, sock.makefile('wb') as w:
+                self._serve(r, w)
+
+    def start(self):
+        th = threading.Thread(target=self.run, daemon=True)
+        th.start()
+        return th
+
+    def _serve(self, r, w):
+        if self._protocol.binary:
+            w.write(r.readline())  # accept the handshake
+            w.flush()
+        queue = []
+        num_sent = 0
+        while True:
+            tasks = self._protocol.read_tasks(r)
+            if tasks is None:
+                return
+            queue.extend(tasks)
+            self.received.extend(tid for tid, _ in tasks)
+            if not queue or num_sent == self.max_results:
+                return
+            tid, cmd = queue.pop(0)
+            self.executed.append(tid)
+            results = self.simulator(tid, cmd)
+            start_at = self._clock
+            self._clock += 1
+            w.write(self._protocol.encode_result(tid, results, 0, 0, start_at, self._clock))
+            w.flush()
+            num_sent += 1
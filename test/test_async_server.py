@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+from caravan.async_server import AsyncServer
+from caravan.server import Server
+from caravan.tables import Tables
+from caravan.task import Task
+from caravan.parameter_set import ParameterSet
+from caravan.metrics import Metrics
+
+
+class FakeScheduler:
+    # receives tasks from the server and returns a result for each reply like the CARAVAN scheduler
+    def __init__(self, reader):
+        self.reader = reader
+        self.running = []
+        self.num_replies = 0
+
+    def write(self, s):
+        for line in s.splitlines():
+            if line:
+                self.running.append(int(line.split(' ')[0]))
+            else:
+                self.num_replies += 1
+                self._send_result()
+
+    def flush(self):
+        pass
+
+    def _send_result(self):
+        if self.running:
+            tid = self.running.pop(0)
+            self.reader.feed_data(("%d 0 1 10 20 %d.0\n" % (tid, tid)).encode())
+        else:
+            self.reader.feed_eof()
+
+
+class AsyncServerTest(unittest.TestCase):
+    def setUp(self):
+        self.t = Tables.get()
+        self.t.clear()
+        ParameterSet.set_command_func(lambda params, seed: "echo %s %d" % (str(params), seed))
+        self.server = AsyncServer()
+        Server._instance = self.server
+
+    def tearDown(self):
+        self.t.clear()
+
+    def _run(self, main):
+        async def _serve():
+            reader = asyncio.StreamReader()
+            self.server._out = FakeScheduler(reader)
+            return await self.server.serve(main(), reader)
+        return asyncio.run(_serve())
+
+    def test_wait_ps(self):
+        server = self.server
+
+        async def search(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(2)
+            await server.wait_ps(ps)
+            ps.create_runs_upto(4)
+            await server.wait_ps(ps)
+            return len(ps.finished_runs())
+
+        async def main():
+            return await asyncio.gather(*[search(i) for i in range(10)])
+
+        self.assertEqual(self._run(main), [4] * 10)
+        self.assertEqual(len(Task.all()), 40)
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+        self.assertEqual(self.server._out.running, [])
+
+    def test_wait_all(self):
+        server = self.server
+
+        async def main():
+            pss = [ParameterSet.find_or_create(i, 1) for i in range(5)]
+            for ps in pss:
+                ps.create_runs_upto(2)
+            await server.wait_all_ps(pss)
+            tasks = [Task.create("echo %d" % i) for i in range(5)]
+            await server.wait_task(tasks[0])
+            finished = await server.wait_all_tasks(tasks)
+            await server.wait_ps(pss[0])  # already finished
+            return [t.results for t in finished]
+
+        self.assertEqual(self._run(main), [(float(i),) for i in range(10, 15)])
+
+    def test_max_in_flight(self):
+        server = self.server
+        server.max_in_flight = 3
+
+        async def main():
+            tasks = [Task.create("echo %d" % i) for i in range(10)]
+            await server.wait_all_tasks(tasks)
+            return len([t for t in tasks if t.is_finished()])
+
+        self.assertEqual(self._run(main), 10)
+        self.assertEqual(server.in_flight_stats()["peak_in_flight"], 3)
+
+    def test_metrics(self):
+        server = self.server
+        server.metrics = Metrics()
+
+        async def main():
+            tasks = [Task.create("echo %d" % i) for i in range(4)]
+            await server.wait_all_tasks(tasks)
+
+        self._run(main)
+        s = server.metrics.snapshot()
+        self.assertEqual(s["histograms"]["receive_batch_size"]["count"], 4)
+        self.assertIn("input_wait_seconds", s["counters"])
+        self.assertEqual(s["histograms"]['dispatch_seconds{kind="task_group"}']["count"], 1)
+
+    def test_no_task(self):
+        async def main():
+            return 1
+
+        self.assertEqual(self._run(main), 1)
+        self.assertEqual(self.server._out.num_replies, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from caravan import generator_fiber
+from caravan.generator_fiber import Fiber
+
+
+class GeneratorFiberTest(unittest.TestCase):
+    def test_switch(self):
+        main = Fiber.current()
+        log = []
+
+        def f(n):
+            for i in range(n):
+                log.append(i)
+                self.assertIs(Fiber.current(), fb)
+                yield main
+            log.append("end")
+
+        fb = Fiber(target=f, args=[2])
+        self.assertTrue(fb.is_alive())
+        fb.switch()
+        self.assertEqual(log, [0])
+        self.assertIs(Fiber.current(), main)
+        fb.switch()
+        fb.switch()
+        self.assertEqual(log, [0, 1, "end"])
+        self.assertFalse(fb.is_alive())
+        self.assertRaises(generator_fiber.error, fb.switch)
+
+    def test_switch_between_fibers(self):
+        log = []
+
+        def ping():
+            log.append("ping")
+            yield f2
+            log.append("ping2")
+
+        def pong():
+            log.append("pong")
+            yield f1
+
+        f1 = Fiber(target=ping)
+        f2 = Fiber(target=pong)
+        f1.switch()
+        self.assertEqual(log, ["ping", "pong", "ping2"])
+        self.assertFalse(f1.is_alive())
+        self.assertTrue(f2.is_alive())
+
+    def test_plain_function_target(self):
+        log = []
+
+        def g():
+            log.append("g")
+            yield plain
+
+        def f():
+            gf = Fiber(target=g)
+            gf.switch()
+            log.append("f")
+
+        plain = Fiber(target=f)
+        plain.switch()
+        self.assertEqual(log, ["g", "f"])
+        self.assertFalse(plain.is_alive())
+
+    def test_exception(self):
+        def f():
+            yield None
+            raise ValueError("x")
+
+        fb = Fiber(target=f)
+        fb.switch()
+        self.assertRaises(ValueError, fb.switch)
+        self.assertFalse(fb.is_alive())
+        self.assertIsNot(Fiber.current(), fb)
+
+    def test_switch_without_yield(self):
+        other = Fiber(target=lambda: None)
+
+        def f():
+            other.switch()
+            yield None
+
+        fb = Fiber(target=f)
+        self.assertRaises(generator_fiber.error, fb.switch)
+
+
+if __name__ == '__main__':
+    unittest.main()
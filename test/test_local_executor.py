@@ -0,0 +1,78 @@
+import unittest
+import logging
+import tempfile
+import shutil
+from caravan.server import Server
+from caravan.local_executor import start_local
+from caravan.tables import Tables
+from caravan.task import Task
+from caravan.parameter_set import ParameterSet
+from caravan.metrics import Metrics
+
+
+class LocalExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.t = Tables.get()
+        self.t.clear()
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+        self.t.clear()
+
+    def test_run_commands(self):
+        ParameterSet.set_command_func(lambda params, seed: "echo %d %d > _results.txt" % (params[0] * 10, seed))
+        server = start_local(num_proc=3, work_dir=self.work_dir)
+        averages = []
+
+        def run_ps(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(2)
+            Server.await_ps(ps)
+            averages.append((i, ps.average_results()))
+
+        def run_all():
+            failed = Task.create("exit 3")
+            for i in range(4):
+                Server.async_(run_ps, i)
+            Server.await_task(failed)
+
+        with server:
+            Server.async_(run_all)
+        self.assertEqual(sorted(averages), [(i, (i * 10.0, 0.5)) for i in range(4)])
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+        self.assertEqual((Task.find(0).rc, Task.find(0).results), (3, ()))
+        self.assertTrue(all(0 <= t.place_id < 3 and t.start_at <= t.finish_at for t in Task.all()))
+        self.assertEqual(server._workers, [])
+
+    def test_metrics(self):
+        metrics = Metrics()
+        server = start_local(num_proc=2, work_dir=self.work_dir, metrics=metrics)
+        tasks = []
+
+        def run():
+            tasks.extend(Task.create("echo %d > _results.txt" % i) for i in range(3))
+            Server.await_all_tasks(tasks)
+
+        with server:
+            Server.async_(run)
+        s = metrics.snapshot()
+        self.assertEqual(s["counters"]["results_received"], 3)
+        self.assertIn("input_wait_seconds", s["counters"])
+
+    def test_malformed_results(self):
+        server = start_local(num_proc=2, work_dir=self.work_dir, logger=logging.getLogger("test_local_executor"))
+        tasks = []
+
+        def run():
+            tasks.extend([Task.create("echo abc > _results.txt"), Task.create("echo 1.5 > _results.txt")])
+            Server.await_all_tasks(tasks)
+
+        with self.assertLogs("test_local_executor", level="ERROR"):
+            with server:
+                Server.async_(run)
+        self.assertEqual([(t.rc, t.results) for t in tasks], [(-1, ()), (0, (1.5,))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from caravan.metrics import Metrics, JsonLinesSink, PrometheusSink
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_prometheus_text(self):
+        m = Metrics()
+        m.count("results_received")
+        m.count("results_received", 2)
+        m.set("tasks_in_flight", 4)
+        for v in (0.5, 3, 100):
+            m.observe("batch", v, buckets=(1, 10), kind="a")
+        self.assertEqual(m.prometheus_text(), "\n".join([
+            '# TYPE caravan_batch histogram',
+            'caravan_batch_bucket{kind="a",le="1"} 1',
+            'caravan_batch_bucket{kind="a",le="10"} 2',
+            'caravan_batch_bucket{kind="a",le="+Inf"} 3',
+            'caravan_batch_sum{kind="a"} 103.5',
+            'caravan_batch_count{kind="a"} 3',
+            '# TYPE caravan_results_received counter',
+            'caravan_results_received_total 3',
+            '# TYPE caravan_tasks_in_flight gauge',
+            'caravan_tasks_in_flight 4',
+        ]) + "\n")
+
+    def test_sinks(self):
+        jsonl = os.path.join(self.dir, "m.jsonl")
+        prom = os.path.join(self.dir, "m.prom")
+        m = Metrics([JsonLinesSink(jsonl), PrometheusSink(prom)], interval=3600)
+        m.count("results_received", 5)
+        m.maybe_flush()  # not yet
+        m.flush()
+        m.count("results_received", 1)
+        m.observe("dispatch_seconds", 0.002, kind="ps")
+        m.close()
+        with open(jsonl) as f:
+            lines = [json.loads(l) for l in f]
+        self.assertEqual([l["counters"]["results_received"] for l in lines], [5, 6])
+        self.assertGreater(lines[1]["rates"]["results_received"], 0)
+        self.assertEqual(lines[1]["histograms"]['dispatch_seconds{kind="ps"}']["count"], 1)
+        with open(prom) as f:
+            self.assertIn("caravan_results_received_total 6\n", f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
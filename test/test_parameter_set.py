@@ -1,4 +1,9 @@
 import unittest
+import math
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from caravan.tables import Tables
 from caravan.parameter_set import ParameterSet
 
@@ -38,6 +43,53 @@ class ParameterSetTest(unittest.TestCase):
         self.assertEqual([r.id for r in runs], [3, 4, 5])
         self.assertEqual([r.seed for r in runs], [0, 1, 2])
 
+    def test_find_or_create_many(self):
+        ps0 = ParameterSet.find_or_create(1, 1)
+        pss = ParameterSet.find_or_create_many([[0, 1], [1, 1], (2, 1), [0, 1]])
+        self.assertEqual([ps.id for ps in pss], [1, 0, 2, 1])
+        self.assertIs(pss[1], ps0)
+        self.assertIs(ParameterSet.find_or_create(2, 1), pss[2])
+        self.assertEqual(len(ParameterSet.all()), 3)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_find_or_create_many_ndarray(self):
+        grid = np.array(np.meshgrid(np.arange(3), np.arange(2))).reshape(2, -1).T
+        pss = ParameterSet.find_or_create_many(grid)
+        self.assertEqual(len(pss), 6)
+        self.assertIs(ParameterSet.find_or_create(2, 1), pss[5])
+        self.assertEqual(type(pss[0].params[0]), int)
+
+    def test_create_runs_many(self):
+        pss = ParameterSet.find_or_create_many([[i, 0] for i in range(3)])
+        pss[1].create_runs_upto(1)
+        runs = ParameterSet.create_runs_many(pss, 2, priority=3)
+        self.assertEqual([(r.id, r.ps_id, r.seed) for r in runs],
+                         [(1, 0, 0), (2, 0, 1), (3, 1, 1), (4, 1, 2), (5, 2, 0), (6, 2, 1)])
+        self.assertEqual(pss[1].run_ids, [0, 3, 4])
+        self.assertTrue(all(r.priority == 3 for r in runs))
+        self.assertEqual(self.t.num_unfinished_tasks(), 7)
+        runs[2].store_result([1.0], 0, 0, 0, 1)
+        pss[1].runs()[0].store_result([3.0], 0, 0, 0, 1)
+        self.assertFalse(pss[1].is_finished())
+        runs[3].store_result([2.0], 0, 0, 0, 1)
+        self.assertTrue(pss[1].is_finished())
+        self.assertEqual(pss[1].average_results(), (2.0,))
+
+    def test_nearest_and_in_range(self):
+        pss = ParameterSet.find_or_create_many([[x, y] for x in range(10) for y in range(10)])
+        self.assertEqual(ParameterSet.nearest((3.2, 4.1)), [pss[34]])
+        self.assertEqual([ps.params for ps in ParameterSet.nearest((0, 0), 3)], [(0, 0), (0, 1), (1, 0)])
+        self.assertEqual([ps.params for ps in ParameterSet.in_range((2, 3), (3, 4))],
+                         [(2, 3), (2, 4), (3, 3), (3, 4)])
+        ps = ParameterSet.find_or_create(3.5, 4.0)  # added to the index
+        self.assertIs(ParameterSet.nearest((3.4, 4.1))[0], ps)
+        ParameterSet.set_spatial_index(0.5)
+        self.assertEqual(ParameterSet.in_range((3.2, 4), (3.6, 4)), [ps])
+        ParameterSet.find_or_create(float('inf'), 0.0)  # not indexed
+        ParameterSet.find_or_create(float('nan'), 0.0)
+        self.assertEqual([ps.params for ps in ParameterSet.in_range((-float('inf'), 0), (2.5, 0))],
+                         [(0, 0), (1, 0), (2, 0)])
+
     def test_is_finished(self):
         ps = ParameterSet.find_or_create(0, 1, 2, 3)
         self.assertEqual(ps.is_finished(), True)
@@ -56,6 +108,71 @@ class ParameterSetTest(unittest.TestCase):
             r.store_result([1.0 + i, 2.0 + i, 3.0 + 1], 0, 3, 111, 222)
         self.assertEqual(ps.average_results(), (2.0, 3.0, 4.0))
 
+    def test_running_aggregates(self):
+        ps = ParameterSet.find_or_create(0, 1, 2, 3)
+        runs = ps.create_runs_upto(5)
+        self.assertEqual(ps.variance_results(), ())
+        values = [1.5, 2.5, 4.0, 8.0]
+        for (x, r) in zip(values, runs):
+            r.store_result([x, -x], 0, 3, 111, 222)
+        runs[4].store_result([100.0, 100.0], 1, 3, 111, 222)
+        self.assertTrue(ps.is_finished())
+        mean = sum(values) / 4
+        var = sum((x - mean) ** 2 for x in values) / 3
+        for (a, b) in zip(ps.average_results(), (mean, -mean)):
+            self.assertAlmostEqual(a, b)
+        for (a, b) in zip(ps.variance_results(), (var, var)):
+            self.assertAlmostEqual(a, b)
+
+    def test_aggregates_of_different_lengths(self):
+        ps = ParameterSet.find_or_create(0, 1, 2, 3)
+        for (r, results) in zip(ps.create_runs(4), [[1.0], [3.0, 10.0], [5.0, 20.0, 7.0], [7.0]]):
+            r.store_result(results, 0, 3, 111, 222)
+        self.assertEqual(ps.average_results(), (4.0, 15.0, 7.0))
+        var = ps.variance_results()
+        self.assertAlmostEqual(var[0], 20.0 / 3)
+        self.assertAlmostEqual(var[1], 50.0)
+        self.assertTrue(math.isnan(var[2]))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_result_stats(self):
+        ps = ParameterSet.find_or_create(0, 1, 2, 3)
+        runs = ps.create_runs_upto(4)
+        for (i, r) in enumerate(runs[:3]):
+            r.store_result([1.0 + i, 2.0 * i], 0, 3, 111, 222)
+        runs[3].store_result([100.0, 100.0], 1, 3, 111, 222)
+        stats = ps.result_stats()
+        self.assertEqual(stats["count"], 3)
+        np.testing.assert_allclose(stats["mean"], [2.0, 2.0])
+        np.testing.assert_allclose(stats["var"], [1.0, 4.0])
+        np.testing.assert_allclose(stats["stderr"], np.sqrt([1.0 / 3, 4.0 / 3]))
+        np.testing.assert_allclose(stats["min"], [1.0, 0.0])
+        np.testing.assert_allclose(stats["max"], [3.0, 4.0])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_result_stats_many(self):
+        pss = [ParameterSet.find_or_create(i, 0) for i in range(3)]
+        for (i, ps) in enumerate(pss):
+            for (j, r) in enumerate(ps.create_runs(i)):
+                r.store_result([float(i + j)], 0, 3, 111, 222)
+        stats = ParameterSet.result_stats_many(pss)
+        np.testing.assert_array_equal(stats["count"], [0, 1, 2])
+        np.testing.assert_allclose(stats["mean"], [[np.nan], [1.0], [2.5]])
+        np.testing.assert_allclose(stats["var"], [[np.nan], [np.nan], [0.5]])
+        np.testing.assert_allclose(stats["max"], [[np.nan], [1.0], [3.0]])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_result_stats_different_lengths(self):
+        ps = ParameterSet.find_or_create(0, 1)
+        for (r, results) in zip(ps.create_runs(3), [[1.0], [3.0, 10.0], [5.0, 20.0]]):
+            r.store_result(results, 0, 3, 111, 222)
+        stats = ParameterSet.result_stats_many([ps, ParameterSet.find_or_create(0, 2)])
+        np.testing.assert_array_equal(stats["count"], [3, 0])
+        np.testing.assert_allclose(stats["mean"], [[3.0, 15.0], [np.nan, np.nan]])
+        np.testing.assert_allclose(stats["var"], [[4.0, 50.0], [np.nan, np.nan]])
+        np.testing.assert_allclose(stats["stderr"], [[np.sqrt(4.0 / 3), 5.0], [np.nan, np.nan]])
+        np.testing.assert_allclose(stats["min"], [[1.0, 10.0], [np.nan, np.nan]])
+
     def test_all(self):
         ps = ParameterSet.find_or_create(0, 1, 2, 3)
         self.assertEqual(ParameterSet.all(), [ps])
@@ -0,0 +1,47 @@
+import unittest
+import os
+import tempfile
+from caravan.protocol import TextProtocol, BinaryProtocol
+from caravan.tables import Tables
+from caravan.task import Task
+
+
+class ProtocolTest(unittest.TestCase):
+    def setUp(self):
+        self.t = Tables.get()
+        self.t.clear()
+
+    def tearDown(self):
+        self.t.clear()
+
+    def test_text(self):
+        p = TextProtocol()
+        tasks = [Task.create("echo %d" % i) for i in range(2)]
+        self.assertEqual(p.encode_tasks(tasks), "0 echo 0\n1 echo 1\n\n")
+        buf = bytearray(b"1 0 3 10 20 0.5 2\n\n")
+        self.assertEqual(p.message_end(buf), 18)
+        self.assertEqual(p.decode_result(bytes(buf[:18])), (1, [0.5, 2.0], 0, 3, 10, 20))
+        self.assertIsNone(p.decode_result(b"\n"))
+
+    def test_binary_result_matches_dump_binary(self):
+        p = BinaryProtocol()
+        tasks = [Task.create("echo %d" % i) for i in range(3)]
+        tasks[0].store_result([0.1, 0.2], 0, 3, 10, 20)
+        tasks[2].store_result([], 1, 4, 30, 40)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        Task.dump_binary(path)
+        with open(path, 'rb') as f:
+            buf = bytearray(f.read())
+        end = p.message_end(buf)
+        self.assertEqual(end, 64)
+        self.assertEqual(p.decode_result(bytes(buf[:end])), (0, (0.1, 0.2), 0, 3, 10, 20))
+        del buf[:end]
+        self.assertEqual(p.decode_result(bytes(buf)), (2, (), 1, 4, 30, 40))
+        self.assertEqual(p.message_end(buf[:47]), -1)
+        self.assertIsNone(p.decode_result(bytes(buf[:47])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+from caravan.result_cache import ResultCache
+from caravan.tables import Tables
+from caravan.task import Task
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.t = Tables.get()
+        self.t.clear()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        self.t.clear()
+
+    def test_get_put(self):
+        c = ResultCache(self.path)
+        self.assertIsNone(c.get("echo 1"))
+        c.put("echo 1", [1.0, 0.1], 0, 3, 100, 200)
+        self.assertEqual(c.get("echo 1"), ((1.0, 0.1), 0, 3, 100, 200))
+        c.put("echo 1", [2.0], 0, 4, 100, 200)
+        self.assertEqual(c.get("echo 1"), ((2.0,), 0, 4, 100, 200))
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.stats(), {"hits": 2, "misses": 1, "size": 1, "max_entries": None})
+        c.close()
+        c = ResultCache(self.path)
+        self.assertEqual(c.get("echo 1"), ((2.0,), 0, 4, 100, 200))
+        c.close()
+
+    def test_eviction(self):
+        c = ResultCache(self.path, max_entries=3)
+        for i in range(3):
+            c.put("echo %d" % i, [float(i)], 0, 0, 0, 1)
+        c.get("echo 0")
+        c.put("echo 3", [3.0], 0, 0, 0, 1)
+        self.assertEqual(len(c), 3)
+        self.assertIsNone(c.get("echo 1"))
+        self.assertIsNotNone(c.get("echo 0"))
+        c.close()
+
+    def test_task(self):
+        c = ResultCache(self.path)
+        t = Task.create("echo")
+        self.assertFalse(c.load_result(t))
+        t.store_result([1.0], 0, 1, 2, 3)
+        c.save_result(t)
+        failed = Task.create("false")
+        failed.store_result([], 1, 1, 2, 3)
+        c.save_result(failed)
+        self.assertEqual(len(c), 1)
+        t2 = Task.create("echo")
+        self.assertTrue(c.load_result(t2))
+        self.assertEqual((t2.results, t2.rc, t2.place_id), ((1.0,), 0, 1))
+        c.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
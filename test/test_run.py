@@ -1,4 +1,5 @@
 import unittest
+import pickle
 from caravan.run import Run
 from caravan.tables import Tables
 from caravan.parameter_set import ParameterSet
@@ -23,6 +24,13 @@ class TestRun(unittest.TestCase):
         self.assertEqual(r.finish_at, 222)
         self.assertEqual(r.results, (1.0, 2.0, 3.0))
 
+    def test_slots(self):
+        r = Run(1234, 104, 5678)
+        self.assertFalse(hasattr(r, '__dict__'))
+        r.store_result([1.0, 2.0], 0, 3, 111, 222)
+        r2 = pickle.loads(pickle.dumps(r))
+        self.assertEqual((r2.id, r2.ps_id, r2.seed, r2.results, r2.rc), (1234, 104, 5678, (1.0, 2.0), 0))
+
     def test_all(self):
         ps = ParameterSet.find_or_create((0, 1, 2, 3))
         runs = ps.create_runs_upto(3)
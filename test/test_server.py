@@ -0,0 +1,453 @@
+import unittest
+import io
+import os
+import socket
+import struct
+import tempfile
+import threading
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from caravan.server import Server
+from caravan import generator_fiber
+from caravan.server_stub import start_stub
+from caravan.tables import Tables
+from caravan.task import Task
+from caravan.parameter_set import ParameterSet
+from caravan.result_cache import ResultCache
+from caravan.metrics import Metrics
+from caravan.protocol import HANDSHAKE
+from caravan.transport import SocketTransport, LocalScheduler
+
+
+def stub_sim(t):
+    return (float(t.id),), 1.0
+
+
+def stub_sim_ps(t):
+    x, y = t.parameter_set().params
+    return (float(x * 10 + y),), 1.0 + (x % 3) + t.seed
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.t = Tables.get()
+        self.t.clear()
+        fd, self.dump_path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.dump_path)
+        self.t.clear()
+
+    def test_await_ps(self):
+        self.server = start_stub(stub_sim, num_proc=4, dump_path=self.dump_path)
+        finished = []
+
+        def run_ps(params):
+            ps = ParameterSet.find_or_create(params)
+            ps.create_runs_upto(3)
+            Server.await_ps(ps)
+            self.assertTrue(ps.is_finished())
+            ps.create_runs_upto(5)
+            self.assertFalse(ps.is_finished())
+            Server.await_ps(ps)
+            self.assertEqual(len(ps.finished_runs()), 5)
+            finished.append(ps.id)
+
+        with self.server:
+            for i in range(3):
+                Server.async_(run_ps, (i, 1))
+        self.assertEqual(sorted(finished), [0, 1, 2])
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+
+    def test_await_all_ps(self):
+        self.server = start_stub(stub_sim, num_proc=3, dump_path=self.dump_path)
+        results = []
+
+        def run_all():
+            pss = [ParameterSet.find_or_create(i, 2) for i in range(10)]
+            for ps in pss:
+                ps.create_runs_upto(2)
+            Server.await_all_ps(pss)
+            self.assertTrue(all(ps.is_finished() for ps in pss))
+            Server.await_all_ps(pss)  # already finished
+            results.append(len(Task.all()))
+
+        with self.server:
+            Server.async_(run_all)
+        self.assertEqual(results, [20])
+
+    def test_watch_reopened_ps(self):
+        self.server = start_stub(stub_sim, num_proc=1, dump_path=self.dump_path)
+        ps1 = ParameterSet.find_or_create(0, 0)
+        ps2 = ParameterSet.find_or_create(1, 0)
+        ps1.create_runs_upto(1)
+        ps2.create_runs_upto(1)
+        called = []
+
+        def on_ps1(ps):
+            ps.create_runs_upto(2)
+
+        def on_all(pss):
+            called.append([len(ps.finished_runs()) for ps in pss])
+
+        Server.watch_ps(ps1, on_ps1)
+        Server.watch_all_ps([ps1, ps2], on_all)
+        with self.server:
+            pass
+        self.assertEqual(called, [[2, 1]])
+
+    def test_watch_all_tasks(self):
+        self.server = start_stub(stub_sim, num_proc=2, dump_path=self.dump_path)
+        tasks = [Task.create("echo %d" % i) for i in range(4)]
+        called = []
+        # several groups completed by the same task
+        Server.watch_all_tasks(tasks[:2], lambda ts: called.append(("a", [t.id for t in ts])))
+        Server.watch_all_tasks(tasks[1:2], lambda ts: called.append(("b", [t.id for t in ts])))
+        Server.watch_all_tasks(tasks, lambda ts: called.append(("c", [t.id for t in ts])))
+        Server.watch_all_tasks(tasks[1:3], lambda ts: called.append(("d", [t.id for t in ts])))
+        with self.server:
+            pass
+        self.assertEqual(sorted(called), [("a", [0, 1]), ("b", [1]), ("c", [0, 1, 2, 3]), ("d", [1, 2])])
+
+    def test_await_all_tasks(self):
+        self.server = start_stub(stub_sim, num_proc=8, dump_path=self.dump_path)
+        counts = []
+
+        def run_tasks():
+            tasks = [Task.create("echo %d" % i) for i in range(1000)]
+            Server.await_all_tasks(tasks)
+            counts.append(len([t for t in tasks if t.is_finished()]))
+            Server.await_all_tasks(tasks)  # already finished
+            counts.append(len(tasks))
+
+        with self.server:
+            Server.async_(run_tasks)
+        self.assertEqual(counts, [1000, 1000])
+
+    def test_generator_fiber(self):
+        self.server = start_stub(stub_sim, num_proc=4, dump_path=self.dump_path)
+        self.server.fiber_class = generator_fiber.Fiber
+        finished = []
+
+        def run_ps(params):
+            ps = ParameterSet.find_or_create(params)
+            ps.create_runs_upto(3)
+            yield Server.await_ps(ps)
+            self.assertTrue(ps.is_finished())
+            tasks = [Task.create("echo %d" % i) for i in range(3)]
+            yield Server.await_all_tasks(tasks)
+            self.assertTrue(all(t.is_finished() for t in tasks))
+            finished.append(ps.id)
+
+        with self.server:
+            for i in range(3):
+                Server.async_(run_ps, (i, 1))
+        self.assertEqual(sorted(finished), [0, 1, 2])
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+
+    def test_generator_fiber_plain_target(self):
+        self.server = start_stub(stub_sim, num_proc=1, dump_path=self.dump_path)
+        self.server.fiber_class = generator_fiber.Fiber
+
+        def run_task():
+            Server.await_task(Task.create("echo 0"))  # not yielded
+
+        with self.assertRaisesRegex(RuntimeError, "generator fiber backend"):
+            with self.server:
+                Server.async_(run_task)
+
+    def test_max_in_flight(self):
+        self.server = start_stub(stub_sim, num_proc=8, dump_path=self.dump_path, max_in_flight=5)
+
+        def run_tasks():
+            tasks = [Task.create("echo %d" % i) for i in range(30)]
+            Server.await_all_tasks(tasks)
+
+        with self.server:
+            Server.async_(run_tasks)
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+        stats = self.server.in_flight_stats()
+        self.assertEqual(stats["peak_in_flight"], 5)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["max_in_flight"], 5)
+        self.assertGreater(stats["mean_occupancy"], 0.5)
+        self.assertEqual(max(t.finish_at for t in Task.all()), 6000)
+
+    def test_priority(self):
+        self.server = start_stub(stub_sim, num_proc=1, dump_path=self.dump_path, max_in_flight=1)
+        order = []
+
+        def run_tasks():
+            tasks = [Task.create("echo %d" % i, priority=i % 3) for i in range(6)]
+            ps = ParameterSet.find_or_create(0, 0)
+            runs = ps.create_runs(2, priority=1)
+            tasks[0].set_priority(5)
+            Server.await_task(tasks[0])
+            ps.set_priority(10)
+            Server.await_all_tasks(tasks + runs)
+
+        with self.server:
+            Server.async_(run_tasks)
+        order = [t.id for t in sorted(Task.all(), key=lambda t: t.start_at)]
+        self.assertEqual(order, [0, 6, 7, 2, 5, 1, 4, 3])
+
+    def test_metrics(self):
+        metrics = Metrics()
+        self.server = start_stub(stub_sim, num_proc=2, dump_path=self.dump_path, max_in_flight=3, metrics=metrics)
+
+        def run_ps(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(2)
+            Server.await_ps(ps)
+            tasks = [Task.create("echo %d" % j) for j in range(2)]
+            Server.await_all_tasks(tasks)
+
+        with self.server:
+            for i in range(3):
+                Server.async_(run_ps, i)
+        s = metrics.snapshot()
+        self.assertEqual(s["counters"]["results_received"], 12)
+        self.assertEqual(s["counters"]["tasks_submitted"], 12)
+        self.assertEqual(s["counters"]["fiber_switches"], 3 + 6 + 6)
+        self.assertEqual(s["histograms"]["receive_batch_size"]["count"], 12)
+        self.assertEqual(s["histograms"]['dispatch_seconds{kind="ps"}']["count"], 3)
+        self.assertEqual(s["histograms"]['dispatch_seconds{kind="task"}']["count"], 12)
+        self.assertEqual(s["histograms"]['dispatch_seconds{kind="task_group"}']["count"], 3)
+        self.assertEqual(s["gauges"]["tasks_in_flight"], 0)
+        self.assertEqual(s["gauges"]["tasks_pending"], 0)
+
+    def _run_stub_search(self, **kwargs):
+        self.t.clear()
+        server = start_stub(stub_sim_ps, num_proc=3, dump_path=self.dump_path, **kwargs)
+
+        def run_ps(params):
+            ps = ParameterSet.find_or_create(params)
+            ps.create_runs_upto(2)
+            Server.await_ps(ps)
+            if params[0] < 3:
+                Server.async_(run_ps, (params[0] + 3, params[1]))
+
+        with server:
+            for i in range(3):
+                Server.async_(run_ps, (i, 1))
+        return [(t.id, t.results, t.place_id, t.start_at, t.finish_at) for t in Task.all()]
+
+    def test_stub_executor(self):
+        expected = self._run_stub_search()
+        self.assertEqual(len(expected), 12)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            self.assertEqual(self._run_stub_search(executor=ex), expected)
+        with ProcessPoolExecutor(max_workers=2) as ex:
+            self.assertEqual(self._run_stub_search(executor=ex, chunksize=2), expected)
+
+    def test_resume(self):
+        table_path = self.dump_path + ".pkl"
+        self.addCleanup(lambda: [os.remove(p) for p in [table_path, table_path + ".journal"] if os.path.exists(p)])
+        evaluated = []
+
+        def sim(t):
+            evaluated.append(t.id)
+            return stub_sim(t)
+
+        def search():
+            tasks = [Task.create("echo %d" % i) for i in range(2)]
+            Server.await_all_tasks(tasks)
+            for i in range(4):
+                Server.async_(run_ps, i)
+
+        def run_ps(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(2)
+            Server.await_ps(ps)
+            ps.create_runs(2)
+            Server.await_ps(ps)
+
+        # the first execution stops after 6 results
+        server = start_stub(sim, num_proc=2, dump_path=self.dump_path, resume_from=table_path)
+        Tables.enable_journal(table_path, flush_every=1)
+        org_receive = server._receive_result
+        server._receive_result = lambda: org_receive() if len(evaluated) <= 6 else None
+        with server:
+            Server.async_(search)
+        self.t.disable_journal()
+        num_finished = len([t for t in Task.all() if t.is_finished()])
+        num_created = len(Task.all())
+        self.assertGreater(num_created, num_finished)
+
+        evaluated.clear()
+        self.t.clear()
+        server = start_stub(sim, num_proc=2, dump_path=self.dump_path, resume_from=table_path)
+        self.t = Tables.get()
+        self.assertEqual(len(Task.all()), num_created)
+        with server:
+            Server.async_(search)
+        self.assertEqual(len(Task.all()), 18)
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+        self.assertEqual(len(evaluated), 18 - num_finished)
+        self.assertEqual([r.seed for r in ParameterSet.find(0).runs()], [0, 1, 2, 3])
+
+    def test_result_cache(self):
+        cache = ResultCache(self.dump_path + ".db")
+        self.addCleanup(os.remove, self.dump_path + ".db")
+        ParameterSet.set_command_func(lambda params, seed: "sim %s %d" % (str(params), seed))
+        evaluated = []
+
+        def sim(t):
+            evaluated.append(t.id)
+            return stub_sim_ps(t)
+
+        def run_ps(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(2)
+            Server.await_ps(ps)
+            if i < 2:
+                Server.async_(run_ps, i + 1)
+
+        for _ in range(2):
+            self.t.clear()
+            evaluated.clear()
+            server = start_stub(sim, num_proc=2, dump_path=self.dump_path, result_cache=cache)
+            with server:
+                Server.async_(run_ps, 0)
+            self.assertEqual(len(Task.all()), 6)
+            self.assertTrue(all(t.is_finished() for t in Task.all()))
+        self.assertEqual(evaluated, [])
+        self.assertEqual((cache.hits, cache.misses), (6, 6))
+        self.assertEqual(Task.find(5).results, (20.0,))
+        cache.close()
+
+    def _start_with_pipe(self, input_lines, **kwargs):
+        server = Server(**kwargs)
+        Server._instance = server
+        r, w = os.pipe()
+        if server._protocol.binary:
+            os.write(w, b"".join(input_lines))
+            server._out = io.BytesIO()
+        else:
+            os.write(w, "".join(input_lines).encode())
+            server._out = io.StringIO()
+        os.close(w)
+        server._in_fd = r
+        self.addCleanup(os.close, r)
+        return server
+
+    def test_receive_results_in_batch(self):
+        tasks = [Task.create("echo %d" % i) for i in range(3)]
+        lines = ["%d 0 1 100 200 %d.5\n" % (t.id, t.id) for t in tasks] + ["\n"]
+        server = self._start_with_pipe(lines, batch_size=10)
+        server.num_writes = 0
+        org_write = server._out.write
+
+        def write(s):
+            server.num_writes += 1
+            org_write(s)
+
+        server._out.write = write
+        submitted = []
+        org_submit_all = server._submit_all
+
+        def submit_all():
+            submitted.append(len([t for t in tasks if t.is_finished()]))
+            org_submit_all()
+
+        server._submit_all = submit_all
+        with server:
+            pass
+        self.assertEqual(submitted, [0, 3])
+        self.assertEqual(tasks[2].results, (2.5,))
+        self.assertEqual(server._out.getvalue(), "0 echo 0\n1 echo 1\n2 echo 2\n\n" + "\n" * 3)
+        self.assertEqual(server.num_writes, 2)  # the replies to a batch are written at once
+
+    def test_receive_results_one_by_one(self):
+        tasks = [Task.create("echo %d" % i) for i in range(3)]
+        lines = ["%d 0 1 100 200 1.0\n" % t.id for t in tasks]
+        server = self._start_with_pipe(lines)
+        with server:
+            pass
+        self.assertTrue(all(t.is_finished() for t in tasks))
+        self.assertEqual(server._out.getvalue(), "0 echo 0\n1 echo 1\n2 echo 2\n\n" + "\n" * 3)
+
+    def test_binary_protocol(self):
+        tasks = [Task.create("echo %d" % i) for i in range(3)]
+        frames = [struct.pack(">6q2d", t.id, 0, 1, 100, 200, 2, t.id + 0.1, -1.0) for t in tasks]
+        server = self._start_with_pipe([HANDSHAKE] + frames, binary_protocol=True, batch_size=2)
+        with server:
+            pass
+        self.assertEqual([t.results for t in tasks], [(0.1, -1.0), (1.1, -1.0), (2.1, -1.0)])
+        self.assertEqual(tasks[2].finish_at, 200)
+        submitted = b"".join([struct.pack(">2q", t.id, 6) + t.command.encode() for t in tasks])
+        empty = struct.pack(">q", 0)
+        self.assertEqual(server._out.getvalue(), HANDSHAKE + struct.pack(">q", 3) + submitted + empty * 3)
+
+    def test_stub_ignores_binary_protocol_env(self):
+        with mock.patch.dict(os.environ, {"CARAVAN_BINARY_PROTOCOL": "1"}):
+            server = start_stub(stub_sim, num_proc=2, dump_path=self.dump_path)
+        tasks = []
+        with server:
+            Server.async_(lambda: tasks.extend(Task.create("echo %d" % i) for i in range(3)))
+        self.assertTrue(all(t.is_finished() for t in tasks))
+
+    def test_binary_protocol_declined(self):
+        task = Task.create("echo 0")
+        server = self._start_with_pipe([b"\n", b"0 0 1 100 200 1.0\n"], binary_protocol=True)
+        out = server._out
+        with server:
+            pass
+        self.assertEqual(task.results, (1.0,))
+        self.assertFalse(server._protocol.binary)
+        self.assertEqual(out.getvalue(), HANDSHAKE + b"0 echo 0\n\n\n")
+
+    def _run_with_socket(self, address, binary):
+        transport = SocketTransport(address)
+        self.addCleanup(transport.close)
+        server = Server.start(max_in_flight=4, binary_protocol=binary, transport=transport)
+        sim = lambda tid, cmd: [float(tid), float(len(cmd))]
+        schedulers = [LocalScheduler(transport.address, sim, binary, max_results=5),
+                      LocalScheduler(transport.address, sim, binary)]
+
+        def run_schedulers():
+            for s in schedulers:
+                s.run()
+
+        th = threading.Thread(target=run_schedulers, daemon=True)
+        th.start()
+
+        def run_tasks():
+            tasks = [Task.create("echo %d" % i) for i in range(12)]
+            Server.await_all_tasks(tasks)
+
+        with server:
+            Server.async_(run_tasks)
+        th.join(10)
+        self.assertFalse(th.is_alive())
+        self.assertTrue(all(t.is_finished() for t in Task.all()))
+        self.assertEqual(Task.find(11).results, (11.0, 7.0))
+        self.assertEqual(len(schedulers[0].executed), 5)
+        # the tasks in flight when the first scheduler disconnected are executed by the second one
+        lost = set(schedulers[0].received) - set(schedulers[0].executed)
+        self.assertEqual(len(lost), 4)
+        self.assertTrue(lost.issubset(schedulers[1].received))
+        self.assertEqual(sorted(schedulers[0].executed + schedulers[1].executed), list(range(12)))
+
+    def test_unix_socket_reconnect(self):
+        self._run_with_socket(self.dump_path + ".sock", False)
+
+    def test_tcp_socket_reconnect_binary(self):
+        self._run_with_socket(("127.0.0.1", 0), True)
+
+    def test_socket_buffer_size(self):
+        transport = SocketTransport(("127.0.0.1", 0), buffer_size=1 << 16)
+        self.addCleanup(transport.close)
+        client = socket.create_connection(transport.address)
+        self.addCleanup(client.close)
+        transport.connect(False)
+        for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            expected = transport._sock.getsockopt(socket.SOL_SOCKET, opt)
+            self.assertEqual(transport._conn.getsockopt(socket.SOL_SOCKET, opt), expected)
+            self.assertGreaterEqual(expected, 1 << 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
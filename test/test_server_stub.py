@@ -0,0 +1,31 @@
+import unittest
+from caravan.server_stub import EventQueue
+
+
+class _Task:
+    def __init__(self, dt):
+        self.dt = dt
+
+
+class EventQueueTest(unittest.TestCase):
+    def test_pop(self):
+        q = EventQueue(2)
+        tasks = [_Task(dt) for dt in [3, 1, 1, 2]]
+        q.push_all(tasks)
+        popped = []
+        t = q.pop()
+        while t is not None:
+            popped.append((tasks.index(t), t.place_id, t.start_at, t.finish_at))
+            t = q.pop()
+        self.assertEqual(popped, [(1, 1, 0, 1), (2, 1, 1, 2), (0, 0, 0, 3), (3, 1, 2, 4)])
+
+    def test_same_finish_time(self):
+        q = EventQueue(3)
+        tasks = [_Task(5) for _ in range(3)]
+        q.push_all(tasks)
+        self.assertEqual([q.pop() for _ in range(3)], tasks)
+        self.assertIsNone(q.pop())
+
+
+if __name__ == '__main__':
+    unittest.main()
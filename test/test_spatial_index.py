@@ -0,0 +1,53 @@
+import unittest
+import math
+import random
+from caravan.spatial_index import GridIndex
+
+
+class GridIndexTest(unittest.TestCase):
+    def _brute_force(self, points, q, k):
+        d = sorted((math.sqrt(sum((a - b) ** 2 for a, b in zip(p, q))), i) for i, p in points)
+        return d[:k]
+
+    def test_nearest_and_in_range(self):
+        rnd = random.Random(1234)
+        points = [(i, (rnd.uniform(-5, 5), rnd.randint(0, 20), rnd.random())) for i in range(300)]
+        for cell_size in (None, 0.5, [2.0, 3.0, 0.1]):
+            idx = GridIndex(points[:10], cell_size)
+            for i, p in points[10:]:
+                idx.add(i, p)
+            self.assertEqual(len(idx), 300)
+            for _ in range(20):
+                q = (rnd.uniform(-6, 6), rnd.uniform(-1, 21), rnd.random())
+                k = rnd.randint(1, 8)
+                self.assertEqual(idx.nearest(q, k), self._brute_force(points, q, k))
+                lo = (rnd.uniform(-6, 0), rnd.randint(0, 10), 0.2)
+                hi = (rnd.uniform(0, 6), rnd.randint(10, 20), 0.8)
+                expected = [i for i, p in points if all(a <= x <= b for x, a, b in zip(p, lo, hi))]
+                self.assertEqual(idx.in_range(lo, hi), expected)
+
+    def test_non_numeric(self):
+        idx = GridIndex([(0, ("a", 1))])
+        self.assertFalse(idx.add(1, (1, "b")))
+        self.assertTrue(idx.add(2, (1, 2)))
+        self.assertFalse(idx.add(3, (1, 2, 3)))
+        self.assertEqual(idx.nearest((0, 0), 5), [(math.sqrt(5), 2)])
+        self.assertEqual(GridIndex().nearest((0, 0)), [])
+
+    def test_non_finite(self):
+        inf = float('inf')
+        idx = GridIndex([(0, (0.0, 0.0)), (1, (2.0, 1.0))], 1.0)
+        self.assertFalse(idx.add(2, (inf, 0.0)))
+        self.assertFalse(idx.add(3, (float('nan'), 0.0)))
+        self.assertTrue(idx.add(4, (-3.0, 5.0)))
+        self.assertEqual(len(idx), 3)
+        self.assertEqual(idx.in_range((-inf, 0), (2.5, 0)), [0])
+        self.assertEqual(idx.in_range((-inf, -inf), (inf, inf)), [0, 1, 4])
+        self.assertEqual(idx.in_range((float('nan'), 0), (1, 1)), [])
+        self.assertEqual(idx.nearest((1.5, 1.0)), [(0.5, 1)])
+        with self.assertRaises(ValueError):
+            idx.nearest((inf, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
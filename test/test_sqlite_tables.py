@@ -0,0 +1,103 @@
+import unittest
+import os
+import gc
+import tempfile
+from caravan.server import Server
+from caravan.server_stub import start_stub
+from caravan.tables import Tables
+from caravan.sqlite_tables import SqliteTables
+from caravan.parameter_set import ParameterSet
+from caravan.task import Task
+from caravan.run import Run
+
+
+class SqliteTablesTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp()
+        os.close(fd)
+        self.t = SqliteTables.open(self.db_path, cache_size=2, commit_every=3)
+
+    def tearDown(self):
+        Tables.get().close()
+        Tables._instance = None
+        os.remove(self.db_path)
+
+    def _create(self):
+        for i in range(4):
+            ps = ParameterSet.find_or_create(i, 1)
+            for r in ps.create_runs_upto(3):
+                r.store_result([float(i), float(r.seed)], 0, 1, 10, 20)
+        Task.create("echo hello").store_result([5.0], 1, 2, 30, 40)
+        ParameterSet.find_or_create(0, 2).create_runs_upto(2)
+
+    def test_find_and_all(self):
+        self._create()
+        gc.collect()
+        self.assertEqual(len(ParameterSet.all()), 5)
+        self.assertEqual(len(Task.all()), 15)
+        ps = ParameterSet.find_or_create(2, 1)
+        self.assertEqual(ps.id, 2)
+        self.assertIs(ParameterSet.find(2), ps)
+        self.assertEqual(ps.average_results(), (2.0, 1.0))
+        self.assertEqual([r.id for r in ps.runs()], [6, 7, 8])
+        self.assertEqual([r.id for r in Run.all()], [i for i in range(15) if i != 12])
+        self.assertEqual(Task.find(12).results, (5.0,))
+        self.assertEqual([t.id for t in self.t.unfinished_tasks()], [13, 14])
+        self.assertEqual(self.t.num_unfinished_tasks(), 2)
+
+    def test_reopen(self):
+        self._create()
+        Tables.get().close()
+        self.t = SqliteTables.open(self.db_path)
+        self.assertEqual(len(Task.all()), 15)
+        ps = ParameterSet.find_or_create(0, 2)
+        self.assertEqual(ps.id, 4)
+        self.assertFalse(ps.is_finished())
+        self.assertTrue(ParameterSet.find(3).is_finished())
+        self.assertEqual(ParameterSet.find(3).average_results(), (3.0, 1.0))
+        self.assertEqual([t.command for t in Task.all() if not isinstance(t, Run)], ["echo hello"])
+
+    def test_replay_after_reopen(self):
+        self._create()
+        Task.find(14).set_priority(3)
+        Tables.get().close()
+        self.t = SqliteTables.open(self.db_path)
+        self.assertTrue(self.t.is_replaying())
+        self.assertEqual(Task.create("echo hello").id, 12)
+        self.assertEqual(Task.create("echo hello").id, 15)
+        ps = ParameterSet.find_or_create(0, 2)
+        self.assertEqual([r.id for r in ps.create_runs_upto(3)], [13, 14, 16])
+        self.assertEqual(Task.find(14).priority, 3)
+
+    def test_equal_params(self):
+        ps = ParameterSet.find_or_create(1, 2)
+        s = ParameterSet.find_or_create("a" * 3, ("a" * 3,))
+        self.t.commit()
+        self.assertIs(ParameterSet.find_or_create(1.0, 2), ps)
+        self.assertIs(ParameterSet.find_or_create(True, 2.0), ps)
+        self.assertIs(ParameterSet.find_or_create("aaa", ("aaa",)), s)
+        self.assertEqual(ParameterSet.find_or_create(1.5, 2).id, 2)
+        self.assertEqual(len(ParameterSet.all()), 3)
+
+    def test_server(self):
+        fd, dump_path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, dump_path)
+        server = start_stub(lambda t: ((float(t.seed),), 1.0), num_proc=2, dump_path=dump_path)
+        averages = []
+
+        def run_ps(i):
+            ps = ParameterSet.find_or_create(i, 0)
+            ps.create_runs_upto(4)
+            Server.await_ps(ps)
+            averages.append(ParameterSet.find(ps.id).average_results())
+
+        with server:
+            for i in range(5):
+                Server.async_(run_ps, i)
+        self.assertEqual(averages, [(1.5,)] * 5)
+        self.assertEqual(self.t.num_unfinished_tasks(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import os.path
 from caravan.tables import Tables
 from caravan.parameter_set import ParameterSet
+from caravan.task import Task
+from caravan.run import Run
 
 
 class TestTables(unittest.TestCase):
@@ -12,12 +14,14 @@ class TestTables(unittest.TestCase):
         self._clean()
 
     def tearDown(self):
+        self.t.disable_journal()
         self._clean()
         self.t.clear()
 
     def _clean(self):
-        if os.path.exists(self.dump_path):
-            os.remove(self.dump_path)
+        for path in [self.dump_path, self.dump_path + ".journal"]:
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_dump_empty(self):
         path = self.dump_path
@@ -46,3 +50,97 @@ class TestTables(unittest.TestCase):
         self.assertEqual(len(self.t.tasks_table), 6)
         self.assertTrue(self.t.tasks_table[0].is_finished())
         self.assertTrue(self.t.tasks_table[5].is_finished())
+
+    def _create_records(self):
+        ps = ParameterSet.find_or_create((0, 1, 2, 3))
+        runs = ps.create_runs_upto(3)
+        runs[0].store_result([1.0, 2.0, 3.0], 0, 3, 111, 222)
+        t = Task.create("echo hello", priority=2)
+        t.store_result([4.0], 1, 1, 10, 20)
+        ps2 = ParameterSet.find_or_create((4, 5, 6, 7))
+        ps2.create_runs_upto(2)
+
+    def _assert_records(self):
+        self.t = Tables.get()
+        self.assertEqual(len(self.t.ps_table), 2)
+        self.assertEqual(len(self.t.tasks_table), 6)
+        ps = ParameterSet.find_or_create((0, 1, 2, 3))
+        self.assertEqual(ps.id, 0)
+        self.assertEqual(ps.run_ids, [0, 1, 2])
+        self.assertFalse(ps.is_finished())
+        self.assertEqual(ps.finished_runs()[0].results, (1.0, 2.0, 3.0))
+        t = Task.find(3)
+        self.assertEqual((t.command, t.priority, t.rc, t.results), ("echo hello", 2, 1, (4.0,)))
+        self.assertEqual([r.seed for r in ParameterSet.find(1).runs()], [0, 1])
+
+    def test_journal(self):
+        Tables.enable_journal(self.dump_path, flush_every=2)
+        self._create_records()
+        self.t.disable_journal()
+        self.t.clear()
+        Tables.load(self.dump_path)
+        self._assert_records()
+
+    def test_journal_after_snapshot(self):
+        Tables.enable_journal(self.dump_path, flush_every=1)
+        ps = ParameterSet.find_or_create((0, 1, 2, 3))
+        ps.create_runs_upto(1)
+        self.t.checkpoint()
+        ps.create_runs_upto(3)
+        self.t.tasks_table[0].store_result([1.0, 2.0, 3.0], 0, 3, 111, 222)
+        Task.create("echo hello", priority=2).store_result([4.0], 1, 1, 10, 20)
+        ParameterSet.find_or_create((4, 5, 6, 7)).create_runs_upto(2)
+        self.t.disable_journal()
+        Tables.load(self.dump_path)
+        self._assert_records()
+
+    def test_compaction(self):
+        Tables.enable_journal(self.dump_path, flush_every=1, compact_every=4)
+        self._create_records()
+        self.assertLess(os.path.getsize(self.dump_path + ".journal"), 100)
+        self.t.disable_journal()
+        Tables.load(self.dump_path)
+        self._assert_records()
+
+    def test_compaction_on_result(self):
+        Tables.enable_journal(self.dump_path, flush_every=1, compact_every=4)
+        ps = ParameterSet.find_or_create((0, 1, 2, 3))
+        runs = ps.create_runs_upto(2)
+        runs[0].store_result([1.0], 0, 1, 10, 20)  # the 4th record
+        runs[1].store_result([3.0], 0, 1, 10, 20)
+        self.t.disable_journal()
+        Tables.load(self.dump_path)
+        ps = ParameterSet.find(0)
+        self.assertTrue(ps.is_finished())
+        self.assertEqual(ps.average_results(), (2.0,))
+
+    def test_journal_priority(self):
+        Tables.enable_journal(self.dump_path, flush_every=1)
+        t = Task.create("echo hello")
+        t.set_priority(5)
+        self.t.disable_journal()
+        Tables.load(self.dump_path)
+        self.assertEqual(Task.find(0).priority, 5)
+
+    def test_indexes(self):
+        self._create_records()
+        self.assertEqual([r.id for r in Run.all()], [0, 1, 2, 4, 5])
+        self.assertEqual([t.id for t in Task.all()], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([t.id for t in self.t.unfinished_tasks()], [1, 2, 4, 5])
+        Run.find(4).store_result([1.0], 0, 3, 111, 222)
+        self.assertEqual(self.t.num_unfinished_tasks(), 3)
+        Tables.dump(self.dump_path)
+        self.t.clear()
+        self.assertEqual(self.t.num_unfinished_tasks(), 0)
+        self.t = Tables.load(self.dump_path)
+        self.assertEqual([r.id for r in Run.all()], [0, 1, 2, 4, 5])
+        self.assertEqual([t.id for t in self.t.unfinished_tasks()], [1, 2, 5])
+
+    def test_truncated_journal(self):
+        Tables.enable_journal(self.dump_path, flush_every=1)
+        self._create_records()
+        self.t.disable_journal()
+        with open(self.dump_path + ".journal", 'ab') as f:
+            f.write(b"\x00\x00\x00\x00\x00\x00\x01\x00abc")
+        Tables.load(self.dump_path)
+        self._assert_records()
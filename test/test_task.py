@@ -1,6 +1,13 @@
 import unittest
+import os
+import struct
+import tempfile
 from caravan.task import Task
 from caravan.tables import Tables
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestRun(unittest.TestCase):
@@ -27,6 +34,13 @@ class TestRun(unittest.TestCase):
             self.assertEqual(t.is_finished(), False)
         self.assertEqual(len(Task.all()), 10)
 
+    def test_priority(self):
+        t = Task.create("echo", priority=3)
+        self.assertEqual(t.priority, 3)
+        t.set_priority(1)
+        self.assertEqual(t.priority, 1)
+        self.assertEqual(Task.create("echo").priority, 0)
+
     def test_all(self):
         tasks = [Task.create("echo %d" % i) for i in range(10)]
         self.assertEqual(Task.all(), tasks)
@@ -36,6 +50,53 @@ class TestRun(unittest.TestCase):
         self.assertEqual(Task.find(5).id, 5)
         self.assertEqual(Task.find(5), tasks[5])
 
+    def _dump(self, results_list, chunk_size=2):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        for i, res in enumerate(results_list):
+            t = Task.create("echo %d" % i)
+            if res is not None:
+                t.store_result(res, i % 2, i, 10 * i, 10 * i + 5)
+        Task.dump_binary(path, chunk_size=chunk_size)
+        return path
+
+    def test_dump_binary(self):
+        path = self._dump([[1.0, 2.0], None, [3.0], [], [4.5, 5.5]])
+        expected = b"".join([struct.pack(">6q2d", 0, 0, 0, 0, 5, 2, 1.0, 2.0),
+                             struct.pack(">6q1d", 2, 0, 2, 20, 25, 1, 3.0),
+                             struct.pack(">6q", 3, 1, 3, 30, 35, 0),
+                             struct.pack(">6q2d", 4, 0, 4, 40, 45, 2, 4.5, 5.5)])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_load_binary_fixed_width(self):
+        path = self._dump([[float(i), -float(i)] for i in range(5)])
+        records = Task.load_binary(path)
+        self.assertIsInstance(records, np.memmap)
+        self.assertEqual(records['id'].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(records['rc'].tolist(), [0, 1, 0, 1, 0])
+        self.assertEqual(records['finish_at'].tolist(), [5, 15, 25, 35, 45])
+        self.assertEqual(records['results'][3].tolist(), [3.0, -3.0])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_load_binary_variable_width(self):
+        path = self._dump([[1.0, 2.0], None, [3.0], [], [4.5, 5.5, 6.5]])
+        records = Task.load_binary(path)
+        self.assertEqual(records['id'].tolist(), [0, 2, 3, 4])
+        self.assertEqual(records['num_results'].tolist(), [2, 1, 0, 3])
+        self.assertEqual(records['start_at'].tolist(), [0, 20, 30, 40])
+        res = records['results']
+        self.assertEqual(res.shape, (4, 3))
+        self.assertEqual(res[3].tolist(), [4.5, 5.5, 6.5])
+        self.assertEqual(res[0, :2].tolist(), [1.0, 2.0])
+        self.assertTrue(np.isnan(res[0, 2]) and np.isnan(res[2]).all())
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_load_binary_empty(self):
+        self.assertEqual(len(Task.load_binary(self._dump([None]))), 0)
+
 
 if __name__ == '__main__':
     unittest.main()